@@ -0,0 +1,28 @@
+"""add-wallet-lock-version
+
+Revision ID: 8f3c2a91d4e6
+Revises: 1b7f75476ca7
+Create Date: 2026-08-27 10:12:31.402156
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3c2a91d4e6'
+down_revision: Union[str, Sequence[str], None] = '1b7f75476ca7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('doctor_wallets', sa.Column('lock_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('doctor_wallets', 'lock_version')
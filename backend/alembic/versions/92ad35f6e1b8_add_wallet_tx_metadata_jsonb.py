@@ -0,0 +1,41 @@
+"""add-wallet-tx-metadata-jsonb
+
+Revision ID: 92ad35f6e1b8
+Revises: c5f91e84a2d7
+Create Date: 2026-08-27 13:44:02.951780
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '92ad35f6e1b8'
+down_revision: Union[str, Sequence[str], None] = 'c5f91e84a2d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'wallet_transactions',
+        sa.Column('metadata', postgresql.JSONB(astext_type=sa.Text()), nullable=True)
+    )
+    # jsonb_path_ops GIN — "pending withdrawals" jaise status lookups index scan se
+    op.create_index(
+        'ix_wtx_meta',
+        'wallet_transactions',
+        ['metadata'],
+        postgresql_using='gin',
+        postgresql_ops={'metadata': 'jsonb_path_ops'}
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_wtx_meta', table_name='wallet_transactions')
+    op.drop_column('wallet_transactions', 'metadata')
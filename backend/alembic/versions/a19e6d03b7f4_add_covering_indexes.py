@@ -0,0 +1,41 @@
+"""add-covering-indexes
+
+Revision ID: a19e6d03b7f4
+Revises: f7b3d58e20c1
+Create Date: 2026-08-27 13:14:55.664103
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a19e6d03b7f4'
+down_revision: Union[str, Sequence[str], None] = 'f7b3d58e20c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Covering indexes — analytics counts aur earnings sum index-only scan se resolve ho
+    op.create_index(
+        'ix_appt_doc_date_status',
+        'appointments',
+        ['doctor_id', 'date', 'status'],
+        postgresql_include=['id']
+    )
+    op.create_index(
+        'ix_wtx_wallet_type_created',
+        'wallet_transactions',
+        ['wallet_id', 'transaction_type', 'created_at'],
+        postgresql_include=['amount']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_wtx_wallet_type_created', table_name='wallet_transactions')
+    op.drop_index('ix_appt_doc_date_status', table_name='appointments')
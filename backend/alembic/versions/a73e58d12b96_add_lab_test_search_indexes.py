@@ -0,0 +1,41 @@
+"""add-lab-test-search-indexes
+
+Revision ID: a73e58d12b96
+Revises: f2b71d94c3a8
+Create Date: 2026-08-27 13:48:05.922471
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a73e58d12b96'
+down_revision: Union[str, Sequence[str], None] = 'f2b71d94c3a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Trigram GIN — search ke ilike('%q%') predicates seq scan ki jagah index use karen
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        'ix_lab_tests_name_desc_trgm',
+        'lab_tests',
+        ['name', 'description'],
+        postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops', 'description': 'gin_trgm_ops'}
+    )
+    # Btree — price/result-time filters aur indexed top-K sort ke liye
+    op.create_index('ix_lab_tests_price', 'lab_tests', ['price'])
+    op.create_index('ix_lab_tests_result_time', 'lab_tests', ['result_time_hours'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_lab_tests_result_time', table_name='lab_tests')
+    op.drop_index('ix_lab_tests_price', table_name='lab_tests')
+    op.drop_index('ix_lab_tests_name_desc_trgm', table_name='lab_tests')
@@ -0,0 +1,34 @@
+"""add-analytics-indexes
+
+Revision ID: b2d7e409c1a5
+Revises: 8f3c2a91d4e6
+Create Date: 2026-08-27 11:05:48.217934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d7e409c1a5'
+down_revision: Union[str, Sequence[str], None] = '8f3c2a91d4e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_appointments_doctor_date', 'appointments', ['doctor_id', 'date'])
+    op.create_index(
+        'ix_wallet_transactions_wallet_created_type',
+        'wallet_transactions',
+        ['wallet_id', 'created_at', 'transaction_type']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_wallet_transactions_wallet_created_type', table_name='wallet_transactions')
+    op.drop_index('ix_appointments_doctor_date', table_name='appointments')
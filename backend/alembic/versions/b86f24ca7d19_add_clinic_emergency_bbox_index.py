@@ -0,0 +1,35 @@
+"""add-clinic-emergency-bbox-index
+
+Revision ID: b86f24ca7d19
+Revises: 92ad35f6e1b8
+Create Date: 2026-08-27 12:36:10.114592
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b86f24ca7d19'
+down_revision: Union[str, Sequence[str], None] = '92ad35f6e1b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Partial index — emergency bbox lookup index range scan bane, seq scan nahi
+    # emergency_available=true rows hi tree me, isliye leading equality column ki zaroorat nahi
+    op.create_index(
+        'ix_clinics_emergency_bbox',
+        'clinics',
+        ['location_lat', 'location_lng'],
+        postgresql_where=sa.text('emergency_available = true')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_clinics_emergency_bbox', table_name='clinics')
@@ -0,0 +1,31 @@
+"""add-can-withdraw-generated-column
+
+Revision ID: c5f91e84a2d7
+Revises: a19e6d03b7f4
+Create Date: 2026-08-27 13:28:19.330562
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f91e84a2d7'
+down_revision: Union[str, Sequence[str], None] = 'a19e6d03b7f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'doctor_wallets',
+        sa.Column('can_withdraw', sa.Boolean(), sa.Computed('current_balance >= 500', persisted=True))
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('doctor_wallets', 'can_withdraw')
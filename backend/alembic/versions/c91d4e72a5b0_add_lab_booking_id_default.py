@@ -0,0 +1,35 @@
+"""add-lab-booking-id-default
+
+Revision ID: c91d4e72a5b0
+Revises: a73e58d12b96
+Create Date: 2026-08-27 15:12:33.481206
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c91d4e72a5b0'
+down_revision: Union[str, Sequence[str], None] = 'a73e58d12b96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # gen_random_uuid PG13+ me builtin hai; purane version ke liye pgcrypto
+    op.execute("CREATE EXTENSION IF NOT EXISTS pgcrypto")
+    # Booking id ab DB-side default se banti hai - Python uuid4 ka
+    # per-row /dev/urandom syscall hat gaya, entropy ek hi batch me
+    op.execute(
+        "ALTER TABLE lab_bookings ALTER COLUMN id SET DEFAULT "
+        "('LAB' || upper(substr(replace(gen_random_uuid()::text, '-', ''), 1, 8)))"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE lab_bookings ALTER COLUMN id DROP DEFAULT")
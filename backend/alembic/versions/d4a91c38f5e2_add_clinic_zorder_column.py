@@ -0,0 +1,44 @@
+"""add-clinic-zorder-column
+
+Revision ID: d4a91c38f5e2
+Revises: b86f24ca7d19
+Create Date: 2026-08-27 12:41:27.803914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a91c38f5e2'
+down_revision: Union[str, Sequence[str], None] = 'b86f24ca7d19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('clinics', sa.Column('zorder', sa.BigInteger(), nullable=True))
+
+    # Backfill existing rows — clinic table chhota hai, per-row update chalega
+    from database.models import morton_zorder
+
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT id, location_lat, location_lng FROM clinics"
+    )).fetchall()
+    for row in rows:
+        bind.execute(
+            sa.text("UPDATE clinics SET zorder = :z WHERE id = :id"),
+            {"z": morton_zorder(row.location_lat, row.location_lng), "id": row.id}
+        )
+
+    op.create_index('ix_clinics_zorder', 'clinics', ['zorder'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_clinics_zorder', table_name='clinics')
+    op.drop_column('clinics', 'zorder')
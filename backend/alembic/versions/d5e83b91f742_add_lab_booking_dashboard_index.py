@@ -0,0 +1,35 @@
+"""add-lab-booking-dashboard-index
+
+Revision ID: d5e83b91f742
+Revises: c91d4e72a5b0
+Create Date: 2026-08-27 15:41:18.204973
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e83b91f742'
+down_revision: Union[str, Sequence[str], None] = 'c91d4e72a5b0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # "My bookings" dashboard: user_id (+status) filter, created_at DESC sort.
+    # INCLUDE se covering index banta hai - hot path pe heap fetch nahi
+    op.create_index(
+        'ix_lab_bookings_user_status_created',
+        'lab_bookings',
+        ['user_id', 'status', sa.text('created_at DESC')],
+        postgresql_include=['id', 'test_id', 'result_pdf_url']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_lab_bookings_user_status_created', table_name='lab_bookings')
@@ -0,0 +1,42 @@
+"""add-doctor-monthly-stats
+
+Revision ID: d91a4f27c8b3
+Revises: b2d7e409c1a5
+Create Date: 2026-08-27 11:38:12.590417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd91a4f27c8b3'
+down_revision: Union[str, Sequence[str], None] = 'b2d7e409c1a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'doctor_monthly_stats',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('doctor_id', sa.Integer(), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Integer(), nullable=False),
+        sa.Column('total_appointments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('cancelled', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('earnings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('doctor_id', 'year', 'month', name='uq_doctor_monthly_stats')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('doctor_monthly_stats')
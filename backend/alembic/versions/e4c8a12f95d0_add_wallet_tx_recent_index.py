@@ -0,0 +1,33 @@
+"""add-wallet-tx-recent-index
+
+Revision ID: e4c8a12f95d0
+Revises: d91a4f27c8b3
+Create Date: 2026-08-27 12:21:06.873521
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4c8a12f95d0'
+down_revision: Union[str, Sequence[str], None] = 'd91a4f27c8b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ORDER BY created_at DESC LIMIT 10 pure index scan se serve ho
+    op.create_index(
+        'ix_wallet_transactions_wallet_created_desc',
+        'wallet_transactions',
+        ['wallet_id', sa.text('created_at DESC')]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_wallet_transactions_wallet_created_desc', table_name='wallet_transactions')
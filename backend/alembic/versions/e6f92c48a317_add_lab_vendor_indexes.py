@@ -0,0 +1,44 @@
+"""add-lab-vendor-indexes
+
+Revision ID: e6f92c48a317
+Revises: d5e83b91f742
+Create Date: 2026-08-27 16:29:47.118520
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f92c48a317'
+down_revision: Union[str, Sequence[str], None] = 'd5e83b91f742'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Lab-vendor dashboard ke hot predicates - seq scan ki jagah index probe
+    op.create_index('ix_lab_bookings_lab_status', 'lab_bookings', ['laboratory_id', 'status'])
+    op.create_index('ix_lab_bookings_lab_date', 'lab_bookings', ['laboratory_id', 'collection_date'])
+    op.create_index('ix_lab_bookings_test_status', 'lab_bookings', ['test_id', 'status'])
+    op.create_index('ix_lab_tests_lab_name', 'lab_tests', ['laboratory_id', 'name'])
+    # Pending/overdue queries ka working set chhota hai - partial index
+    # buffer cache me garam rehta hai
+    op.create_index(
+        'ix_lab_bookings_pending',
+        'lab_bookings',
+        ['laboratory_id'],
+        postgresql_where=sa.text("status IN ('sample_collected', 'processing')")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_lab_bookings_pending', table_name='lab_bookings')
+    op.drop_index('ix_lab_tests_lab_name', table_name='lab_tests')
+    op.drop_index('ix_lab_bookings_test_status', table_name='lab_bookings')
+    op.drop_index('ix_lab_bookings_lab_date', table_name='lab_bookings')
+    op.drop_index('ix_lab_bookings_lab_status', table_name='lab_bookings')
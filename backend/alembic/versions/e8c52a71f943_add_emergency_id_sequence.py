@@ -0,0 +1,29 @@
+"""add-emergency-id-sequence
+
+Revision ID: e8c52a71f943
+Revises: d4a91c38f5e2
+Create Date: 2026-08-27 13:02:48.271369
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8c52a71f943'
+down_revision: Union[str, Sequence[str], None] = 'd4a91c38f5e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # EMG ids ab monotonic sequence se — random collision ka chance zero
+    op.execute("CREATE SEQUENCE emergency_id_seq START 100000")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP SEQUENCE emergency_id_seq")
@@ -0,0 +1,43 @@
+"""clinic-latlng-to-double-precision
+
+Revision ID: f2b71d94c3a8
+Revises: e8c52a71f943
+Create Date: 2026-08-27 13:12:36.584027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b71d94c3a8'
+down_revision: Union[str, Sequence[str], None] = 'e8c52a71f943'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # DECIMAL se double precision — driver ab Decimal objects nahi banayega
+    op.alter_column('clinics', 'location_lat',
+                    existing_type=sa.DECIMAL(10, 8),
+                    type_=sa.Float(precision=53),
+                    existing_nullable=False)
+    op.alter_column('clinics', 'location_lng',
+                    existing_type=sa.DECIMAL(11, 8),
+                    type_=sa.Float(precision=53),
+                    existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('clinics', 'location_lng',
+                    existing_type=sa.Float(precision=53),
+                    type_=sa.DECIMAL(11, 8),
+                    existing_nullable=False)
+    op.alter_column('clinics', 'location_lat',
+                    existing_type=sa.Float(precision=53),
+                    type_=sa.DECIMAL(10, 8),
+                    existing_nullable=False)
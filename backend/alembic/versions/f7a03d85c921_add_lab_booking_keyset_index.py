@@ -0,0 +1,35 @@
+"""add-lab-booking-keyset-index
+
+Revision ID: f7a03d85c921
+Revises: e6f92c48a317
+Create Date: 2026-08-27 17:05:29.663184
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a03d85c921'
+down_revision: Union[str, Sequence[str], None] = 'e6f92c48a317'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Booking-history keyset cursor ka exact predicate/order:
+    # WHERE laboratory_id = ? AND (collection_date, id) < (?, ?)
+    # ORDER BY collection_date DESC, id DESC — pura page ek index range scan
+    op.create_index(
+        'ix_lab_bookings_lab_keyset',
+        'lab_bookings',
+        ['laboratory_id', sa.text('collection_date DESC'), sa.text('id DESC')]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_lab_bookings_lab_keyset', table_name='lab_bookings')
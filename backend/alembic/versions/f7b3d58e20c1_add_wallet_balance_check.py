@@ -0,0 +1,32 @@
+"""add-wallet-balance-check
+
+Revision ID: f7b3d58e20c1
+Revises: e4c8a12f95d0
+Create Date: 2026-08-27 12:52:40.118263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7b3d58e20c1'
+down_revision: Union[str, Sequence[str], None] = 'e4c8a12f95d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_check_constraint(
+        'ck_doctor_wallets_balance_non_negative',
+        'doctor_wallets',
+        'current_balance >= 0'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('ck_doctor_wallets_balance_non_negative', 'doctor_wallets', type_='check')
@@ -355,11 +355,12 @@ async def search_doctors(
         distance = 0.0
         
         if request.user_lat and request.user_lng:
+            # Columns are double precision now - no Decimal conversion needed
             distance = calculate_distance(
                 request.user_lat,
                 request.user_lng,
-                float(doctor.clinic.location_lat),
-                float(doctor.clinic.location_lng)
+                doctor.clinic.location_lat,
+                doctor.clinic.location_lng
             )
         
         # ✅ FIX 5: NO MORE N+1 QUERIES - Use already loaded slots
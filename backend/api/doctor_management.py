@@ -6,18 +6,21 @@ backend_dir = Path(__file__).parent.parent
 if str(backend_dir) not in sys.path:
     sys.path.insert(0, str(backend_dir))
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, func, desc, extract
-from database.connection import get_db
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, UploadFile, File
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, desc, extract, insert, select, update
+from database.connection import get_async_db, AsyncSessionLocal
 from database.models import (
-    User, Doctor, Clinic, DoctorSlot, Appointment, 
-    DoctorWallet, WalletTransaction, AuditLog, Notification
+    User, Doctor, Clinic, DoctorSlot, Appointment,
+    DoctorWallet, WalletTransaction, DoctorMonthlyStats, AuditLog, Notification
 )
 from api.auth import get_current_user
+from services.cache import cache_get_json, cache_set_json
 from pydantic import BaseModel, Field, EmailStr,model_validator
 from typing import List, Optional
 from datetime import datetime, date, time, timedelta
+import asyncio
 import secrets
 import hashlib
 import hmac
@@ -129,6 +132,19 @@ def verify_password(plain_password: str, stored_hash: str) -> bool:
         return False                                     # format wrong ho toh False
 
 
+def _audit_diff(old, new) -> dict:
+    """
+    Audit ke liye compact diff — pura old/new value store karne se
+    lambi bio pe audit_logs har update pe double grow karta hai.
+    Old ka sirf hash (tamper-evidence ke liye kaafi) aur new ka
+    chhota preview rakhte hain.
+    """
+    return {
+        "old_hash": hashlib.sha256(str(old).encode()).hexdigest()[:16],
+        "new_preview": str(new)[:120]
+    }
+
+
 def generate_clinic_id() -> str:
     """Generate unique clinic ID"""
     return f"CLI{secrets.randbelow(900) + 100:03d}"
@@ -142,8 +158,45 @@ def generate_token() -> str:
     return secrets.token_urlsafe(32)                     # 32 bytes = ~43 char URL-safe token
 
 
+async def get_current_doctor(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> Doctor:
+    """
+    🩺 Current user ka Doctor profile — request.state pe memoized.
+    Har handler pehle yahi lookup karta tha; ab ek request mein
+    sirf ek baar DB hit hota hai, invalidation ka koi issue nahi
+    kyunki scope ek hi request ka hai.
+    """
+    doctor = getattr(request.state, "doctor", None)
+    if doctor is None:
+        # Cross-request cache: user_id → doctor_id mapping stable hai
+        # (balance jaisi mutable cheez nahi) — hit pe PK lookup kaafi hai.
+        # Doctor row change pe event listener (services/cache.py) key delete
+        # kar deta hai.
+        cache_key = f"doctor:uid:{current_user.id}"
+        cached = await cache_get_json(cache_key)
+        if cached:
+            doctor = await db.get(
+                Doctor, cached["id"], options=[joinedload(Doctor.wallet)]
+            )
+        if doctor is None:
+            # Wallet ek hi round-trip mein eager join ho jata hai —
+            # wallet endpoints ko alag SELECT nahi chahiye
+            doctor = (await db.execute(
+                select(Doctor).options(joinedload(Doctor.wallet))
+                .where(Doctor.user_id == current_user.id)
+            )).scalar_one_or_none()
+            if not doctor:
+                raise HTTPException(status_code=404, detail="Doctor profile not found")
+            await cache_set_json(cache_key, {"id": doctor.id}, ttl=300)
+        request.state.doctor = doctor
+    return doctor
+
+
 def send_notification(
-    db: Session,
+    db: AsyncSession,
     user_id: int,
     title: str,
     message: str,
@@ -178,14 +231,39 @@ def send_notification(
     # Note: db.commit() caller pe hai — yahan sirf add karte hain
 
 
-def create_time_slots(
+async def send_notification_background(
+    user_id: int,
+    title: str,
+    message: str,
+    notification_type: str = "general",
+    related_entity_type: Optional[str] = None,
+    related_entity_id: Optional[str] = None
+) -> None:
+    """
+    📣 BackgroundTasks version — response ja chuki hoti hai aur
+    request-scoped session band, isliye apna session kholke commit karta hai.
+    """
+    async with AsyncSessionLocal() as db:
+        send_notification(
+            db=db,
+            user_id=user_id,
+            title=title,
+            message=message,
+            notification_type=notification_type,
+            related_entity_type=related_entity_type,
+            related_entity_id=related_entity_id
+        )
+        await db.commit()
+
+
+async def create_time_slots(
     doctor_id: int,
     start_date: date,
     end_date: date,
     time_slots: List[dict],
     days: List[str],
     skip_dates: List[date],
-    db: Session
+    db: AsyncSession
 ) -> int:
     """
     Bulk create time slots for doctor
@@ -209,14 +287,17 @@ def create_time_slots(
                 start_time = datetime.strptime(slot['start'], '%H:%M').time()
                 end_time = datetime.strptime(slot['end'], '%H:%M').time()
                 
-                # Check if slot already exists
-                existing = db.query(DoctorSlot).filter(
-                    and_(
-                        DoctorSlot.doctor_id == doctor_id,
-                        DoctorSlot.date == current_date,
-                        DoctorSlot.start_time == start_time
+                # Check if slot already exists — sirf existence chahiye,
+                # full object hydrate karne ki zaroorat nahi
+                existing = await db.scalar(
+                    select(DoctorSlot.id).where(
+                        and_(
+                            DoctorSlot.doctor_id == doctor_id,
+                            DoctorSlot.date == current_date,
+                            DoctorSlot.start_time == start_time
+                        )
                     )
-                ).first()
+                )
                 
                 if not existing:
                     new_slot = DoctorSlot(
@@ -240,7 +321,7 @@ def create_time_slots(
 @router.post("/register", response_model=dict)
 async def register_doctor(
     request: DoctorRegistrationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     📝 DOCTOR REGISTRATION/ONBOARDING
@@ -255,7 +336,9 @@ async def register_doctor(
     """
 
     # --- Step 1: Check if email already registered ---
-    existing_user = db.query(User).filter(User.email == request.email).first()
+    existing_user = await db.scalar(
+        select(User.id).where(User.email == request.email)
+    )
     if existing_user:
         raise HTTPException(
             status_code=400,
@@ -273,10 +356,12 @@ async def register_doctor(
         created_at=datetime.now()
     )
     db.add(new_user)
-    db.flush()                                           # new_user.id milega
+    await db.flush()                                     # new_user.id milega
 
     # --- Step 3: Check if doctor profile already exists (edge case) ---
-    existing_doctor = db.query(Doctor).filter(Doctor.user_id == new_user.id).first()
+    existing_doctor = await db.scalar(
+        select(Doctor.id).where(Doctor.user_id == new_user.id)
+    )
     if existing_doctor:
         raise HTTPException(
             status_code=400, 
@@ -313,7 +398,9 @@ async def register_doctor(
         db.add(clinic)
     else:
         # Verify clinic exists
-        clinic = db.query(Clinic).filter(Clinic.id == clinic_id).first()
+        clinic = (await db.execute(
+            select(Clinic).where(Clinic.id == clinic_id)
+        )).scalar_one_or_none()
         if not clinic:
             raise HTTPException(status_code=404, detail="Clinic not found")
     
@@ -335,7 +422,7 @@ async def register_doctor(
     )
     
     db.add(doctor)
-    db.flush()                                           # Get doctor.id
+    await db.flush()                                     # Get doctor.id
     
     # --- Step 6: Create wallet ---
     wallet = DoctorWallet(
@@ -362,7 +449,7 @@ async def register_doctor(
         {'start': '16:30', 'end': '17:00'},
     ]
     
-    slots_created = create_time_slots(
+    slots_created = await create_time_slots(
         doctor_id=doctor.id,
         start_date=date.today(),
         end_date=date.today() + timedelta(days=30),
@@ -400,8 +487,8 @@ async def register_doctor(
         }
     )
     db.add(audit)
-    db.commit()
-    
+    await db.commit()
+
     return {
         "status": "success",
         "message": "Doctor registration successful. Pending verification.",
@@ -418,13 +505,12 @@ async def register_doctor(
     }
 
 
-
 # ==================== LOGIN ====================
 
 @router.post("/login", response_model=dict)
 async def login_doctor(
     request: DoctorLoginRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     🔐 DOCTOR LOGIN
@@ -435,9 +521,13 @@ async def login_doctor(
 
     # --- Step 1: User dhundho email ya phone se ---
     if request.email:
-        user = db.query(User).filter(User.email == request.email).first()
+        user = (await db.execute(
+            select(User).where(User.email == request.email)
+        )).scalar_one_or_none()
     else:
-        user = db.query(User).filter(User.phone == request.phone).first()
+        user = (await db.execute(
+            select(User).where(User.phone == request.phone)
+        )).scalar_one_or_none()
 
     if not user:
         raise HTTPException(
@@ -453,7 +543,9 @@ async def login_doctor(
         )
 
     # --- Step 3: Doctor profile check karo ---
-    doctor = db.query(Doctor).filter(Doctor.user_id == user.id).first()
+    doctor = (await db.execute(
+        select(Doctor).where(Doctor.user_id == user.id)
+    )).scalar_one_or_none()
     if not doctor:
         raise HTTPException(
             status_code=404,
@@ -464,7 +556,7 @@ async def login_doctor(
     token = generate_token()
     user.auth_token = token
     user.last_login = datetime.now()
-    db.commit()
+    await db.commit()
 
     # --- Step 5: Audit log ---
     audit = AuditLog(
@@ -478,7 +570,7 @@ async def login_doctor(
         }
     )
     db.add(audit)
-    db.commit()
+    await db.commit()
 
     return {
         "status": "success",
@@ -502,22 +594,17 @@ async def login_doctor(
 @router.post("/slots/create-batch", response_model=dict)
 async def create_slots_batch(
     request: CreateSlotBatchRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    doctor: Doctor = Depends(get_current_doctor),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     📅 BULK CREATE SLOTS
     
     Example: Create next 3 months slots in one go
     """
-    
-    # Get doctor profile
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
+
     # Create slots
-    slots_created = create_time_slots(
+    slots_created = await create_time_slots(
         doctor_id=doctor.id,
         start_date=request.start_date,
         end_date=request.end_date,
@@ -526,9 +613,9 @@ async def create_slots_batch(
         skip_dates=request.skip_dates or [],
         db=db
     )
-    
-    db.commit()
-    
+
+    await db.commit()
+
     return {
         "status": "success",
         "slots_created": slots_created,
@@ -538,21 +625,17 @@ async def create_slots_batch(
 
 @router.get("/slots/my-schedule", response_model=dict)
 async def get_my_schedule(
-    current_user: User = Depends(get_current_user),
+    doctor: Doctor = Depends(get_current_doctor),
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     📆 VIEW MY SCHEDULE
     
     Shows all slots with booking status
     """
-    
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
+
     # Default to next 7 days
     if not start_date:
         start_date = date.today()
@@ -560,13 +643,15 @@ async def get_my_schedule(
         end_date = start_date + timedelta(days=7)
 
     # Get slots
-    slots = db.query(DoctorSlot).filter(
-        and_(
-            DoctorSlot.doctor_id == doctor.id,
-            DoctorSlot.date >= start_date,
-            DoctorSlot.date <= end_date
-        )
-    ).order_by(DoctorSlot.date, DoctorSlot.start_time).all()
+    slots = (await db.execute(
+        select(DoctorSlot).where(
+            and_(
+                DoctorSlot.doctor_id == doctor.id,
+                DoctorSlot.date >= start_date,
+                DoctorSlot.date <= end_date
+            )
+        ).order_by(DoctorSlot.date, DoctorSlot.start_time)
+    )).scalars().all()
     
     # Group by date
     schedule = {}
@@ -579,12 +664,14 @@ async def get_my_schedule(
                 "slots": []
             }
         
-        # Get appointment if booked
+        # Get appointment if booked (user eager load — async mein lazy load nahi chalta)
         appointment = None
         if slot.is_booked:
-            appointment = db.query(Appointment).filter(
-                Appointment.slot_id == slot.id
-            ).first()
+            appointment = (await db.execute(
+                select(Appointment).options(joinedload(Appointment.user)).where(
+                    Appointment.slot_id == slot.id
+                )
+            )).scalars().first()
 
         schedule[date_str]["slots"].append({
             "slot_id": slot.id,
@@ -605,8 +692,8 @@ async def get_my_schedule(
 @router.put("/slots/block", response_model=dict)
 async def block_slot(
     request: UpdateSlotRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    doctor: Doctor = Depends(get_current_doctor),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     🚫 BLOCK/UNBLOCK SLOT
@@ -616,17 +703,15 @@ async def block_slot(
     - Personal time
     - Lunch break
     """
-    
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
-    slot = db.query(DoctorSlot).filter(
-        and_(
-            DoctorSlot.id == request.slot_id,
-            DoctorSlot.doctor_id == doctor.id
+
+    slot = (await db.execute(
+        select(DoctorSlot).where(
+            and_(
+                DoctorSlot.id == request.slot_id,
+                DoctorSlot.doctor_id == doctor.id
+            )
         )
-    ).first()
+    )).scalar_one_or_none()
     
     if not slot:
         raise HTTPException(status_code=404, detail="Slot not found")
@@ -639,8 +724,8 @@ async def block_slot(
     
     slot.is_blocked = request.is_blocked if request.is_blocked is not None else True
     slot.block_reason = request.reason
-    
-    db.commit()
+
+    await db.commit()
 
     return {
         "status": "success",
@@ -653,8 +738,8 @@ async def block_slot(
 @router.post("/leave/apply", response_model=dict)
 async def apply_leave(
     request: LeaveRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    doctor: Doctor = Depends(get_current_doctor),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     🏖 APPLY FOR LEAVE
@@ -663,21 +748,19 @@ async def apply_leave(
     Agar kisi patient ka appointment already booked hai ussi range mein,
     toh usse notification milegi ki doctor ne leave apply kiya hai.
     """
-    
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
 
     # --- Pehle: booked appointments dhundho is date range mein ---
     #     Taaki unke patients ko notification de sakein
-    booked_appointments = db.query(Appointment).filter(
-        and_(
-            Appointment.doctor_id == doctor.id,
-            Appointment.date >= request.start_date,
-            Appointment.date <= request.end_date,
-            Appointment.status == "confirmed"
+    booked_appointments = (await db.execute(
+        select(Appointment).where(
+            and_(
+                Appointment.doctor_id == doctor.id,
+                Appointment.date >= request.start_date,
+                Appointment.date <= request.end_date,
+                Appointment.status == "confirmed"
+            )
         )
-    ).all()
+    )).scalars().all()
 
     # Har booked patient ko notification bhejo
     for apt in booked_appointments:
@@ -696,14 +779,16 @@ async def apply_leave(
         )
 
     # --- Get all unbooked slots in date range ---
-    slots = db.query(DoctorSlot).filter(
-        and_(
-            DoctorSlot.doctor_id == doctor.id,
-            DoctorSlot.date >= request.start_date,
-            DoctorSlot.date <= request.end_date,
-            DoctorSlot.is_booked == False
+    slots = (await db.execute(
+        select(DoctorSlot).where(
+            and_(
+                DoctorSlot.doctor_id == doctor.id,
+                DoctorSlot.date >= request.start_date,
+                DoctorSlot.date <= request.end_date,
+                DoctorSlot.is_booked == False
+            )
         )
-    ).all()
+    )).scalars().all()
     
     # Block all available slots
     blocked_count = 0
@@ -714,8 +799,8 @@ async def apply_leave(
     
     # Set doctor as unavailable
     doctor.is_available = False
-    
-    db.commit()
+
+    await db.commit()
     
     return {
         "status": "success",
@@ -730,26 +815,24 @@ async def apply_leave(
 
 @router.get("/appointments/today", response_model=dict)
 async def get_today_appointments(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    doctor: Doctor = Depends(get_current_doctor),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     📋 TODAY'S APPOINTMENTS
     """
-    
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
-    appointments = db.query(Appointment).options(
-        joinedload(Appointment.user)
-    ).filter(
-        and_(
-            Appointment.doctor_id == doctor.id,
-            Appointment.date == date.today(),
-            Appointment.status == 'confirmed'
-        )
-    ).order_by(Appointment.time).all()
+
+    appointments = (await db.execute(
+        select(Appointment).options(
+            joinedload(Appointment.user)
+        ).where(
+            and_(
+                Appointment.doctor_id == doctor.id,
+                Appointment.date == date.today(),
+                Appointment.status == 'confirmed'
+            )
+        ).order_by(Appointment.time)
+    )).scalars().all()
     
     return {
         "date": str(date.today()),
@@ -773,30 +856,28 @@ async def get_today_appointments(
 
 @router.get("/appointments/upcoming", response_model=dict)
 async def get_upcoming_appointments(
-    current_user: User = Depends(get_current_user),
+    doctor: Doctor = Depends(get_current_doctor),
     days: int = 7,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     📅 UPCOMING APPOINTMENTS (Next 7 days)
     """
-    
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
 
     end_date = date.today() + timedelta(days=days)
     
-    appointments = db.query(Appointment).options(
-        joinedload(Appointment.user)
-    ).filter(
-        and_(
-            Appointment.doctor_id == doctor.id,
-            Appointment.date >= date.today(),
-            Appointment.date <= end_date,
-            Appointment.status == 'confirmed'
-        )
-    ).order_by(Appointment.date, Appointment.time).all()
+    appointments = (await db.execute(
+        select(Appointment).options(
+            joinedload(Appointment.user)
+        ).where(
+            and_(
+                Appointment.doctor_id == doctor.id,
+                Appointment.date >= date.today(),
+                Appointment.date <= end_date,
+                Appointment.status == 'confirmed'
+            )
+        ).order_by(Appointment.date, Appointment.time)
+    )).scalars().all()
     
     # Group by date
     grouped = {}
@@ -826,8 +907,8 @@ async def complete_appointment(
     diagnosis: Optional[str] = None,
     prescription: Optional[dict] = None,
     follow_up_required: bool = False,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    doctor: Doctor = Depends(get_current_doctor),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     ✅ MARK APPOINTMENT AS COMPLETED
@@ -838,25 +919,25 @@ async def complete_appointment(
     - Doctor wallet mein consultation fee credit karta hai
     - Patient ko completion notification bhejta hai
     """
-    
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
 
-    appointment = db.query(Appointment).filter(
-        and_(
-            Appointment.id == appointment_id,
-            Appointment.doctor_id == doctor.id
+    appointment = (await db.execute(
+        select(Appointment).where(
+            and_(
+                Appointment.id == appointment_id,
+                Appointment.doctor_id == doctor.id
+            )
         )
-    ).first()
+    )).scalar_one_or_none()
     
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
     appointment.status = "completed"
     
-    # Increment consultation count
-    doctor.total_consultations += 1
+    # Increment consultation count — server-side expression, taaki concurrent
+    # completions mein read-modify-write race na ho (denormalized counter
+    # hamesha sahi rahe)
+    doctor.total_consultations = Doctor.total_consultations + 1
     
     # Save diagnosis/prescription if provided
     if diagnosis or prescription:
@@ -873,10 +954,8 @@ async def complete_appointment(
         )
         db.add(prescription_record)
 
-    # --- Wallet mein consultation fee credit karo ---
-    wallet = db.query(DoctorWallet).filter(
-        DoctorWallet.doctor_id == doctor.id
-    ).first()
+    # --- Wallet mein consultation fee credit karo (eager-loaded via doctor) ---
+    wallet = doctor.wallet
 
     if wallet:
         credit_amount = doctor.consultation_fee
@@ -889,7 +968,7 @@ async def complete_appointment(
             description=f"Consultation fee — Appointment #{appointment.id}",
             balance_before=wallet.current_balance,
             balance_after=wallet.current_balance + credit_amount,
-            metadata={
+            meta={
                 "appointment_id": str(appointment.id),
                 "patient_user_id": appointment.user_id
             }
@@ -915,9 +994,9 @@ async def complete_appointment(
         related_entity_type="appointment",
         related_entity_id=str(appointment.id)
     )
-    
-    db.commit()
-    
+
+    await db.commit()
+
     return {
         "status": "success",
         "appointment_id": appointment_id,
@@ -930,41 +1009,44 @@ async def complete_appointment(
 
 @router.get("/wallet", response_model=dict)
 async def get_wallet_details(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    doctor: Doctor = Depends(get_current_doctor),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     💰 VIEW WALLET BALANCE & EARNINGS
     """
-    
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
 
-    wallet = db.query(DoctorWallet).filter(
-        DoctorWallet.doctor_id == doctor.id
-    ).first()
-    
+    wallet = doctor.wallet
+
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
-    
-    # Get recent transactions
-    transactions = db.query(WalletTransaction).filter(
-        WalletTransaction.wallet_id == wallet.id
-    ).order_by(desc(WalletTransaction.created_at)).limit(10).all()
+
+    # Get recent transactions — sirf 5 columns chahiye, full ORM object
+    # hydrate karne ki zaroorat nahi; date formatting bhi SQL mein
+    transactions = (await db.execute(
+        select(
+            WalletTransaction.transaction_type,
+            WalletTransaction.amount,
+            WalletTransaction.description,
+            func.to_char(WalletTransaction.created_at, 'YYYY-MM-DD HH12:MI AM').label('date'),
+            WalletTransaction.balance_after,
+        ).where(
+            WalletTransaction.wallet_id == wallet.id
+        ).order_by(desc(WalletTransaction.created_at)).limit(10)
+    )).all()
     
     return {
         "current_balance": wallet.current_balance,
         "total_earned": wallet.total_earned,
         "total_withdrawn": wallet.total_withdrawn,
         "pending_withdrawal": wallet.pending_withdrawal or 0,
-        "can_withdraw": wallet.current_balance >= 500,  # Min ₹500
+        "can_withdraw": wallet.can_withdraw,  # DB generated column (min ₹500)
         "recent_transactions": [
             {
                 "type": tx.transaction_type,
                 "amount": tx.amount,
                 "description": tx.description,
-                "date": tx.created_at.strftime('%Y-%m-%d %I:%M %p'),
+                "date": tx.date,
                 "balance_after": tx.balance_after
             }
             for tx in transactions
@@ -975,8 +1057,10 @@ async def get_wallet_details(
 @router.post("/wallet/withdraw", response_model=dict)
 async def withdraw_earnings(
     request: WithdrawRequest,
+    background_tasks: BackgroundTasks,
+    doctor: Doctor = Depends(get_current_doctor),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     💸 WITHDRAW EARNINGS TO BANK
@@ -984,17 +1068,6 @@ async def withdraw_earnings(
     Min: ₹500
     Processing: 2-3 business days
     """
-    
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
-    wallet = db.query(DoctorWallet).filter(
-        DoctorWallet.doctor_id == doctor.id
-    ).with_for_update().first()
-    
-    if not wallet:
-        raise HTTPException(status_code=404, detail="Wallet not found")
 
     # Validation
     if request.amount < 500:
@@ -1002,37 +1075,65 @@ async def withdraw_earnings(
             status_code=400,
             detail="Minimum withdrawal amount is ₹500"
         )
-    
-    if wallet.current_balance < request.amount:
+
+    if not doctor.wallet:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+
+    # Atomic guarded UPDATE — balance check aur debit ek hi statement mein.
+    # WHERE current_balance >= amount hi invariant enforce karta hai, Python
+    # mein lock hold karne ki zaroorat nahi; concurrent debits mein se ek
+    # ka guard fail ho jata hai (rowcount 0)
+    row = (await db.execute(
+        update(DoctorWallet)
+        .where(
+            and_(
+                DoctorWallet.doctor_id == doctor.id,
+                DoctorWallet.current_balance >= request.amount
+            )
+        )
+        .values(
+            current_balance=DoctorWallet.current_balance - request.amount,
+            total_withdrawn=DoctorWallet.total_withdrawn + request.amount,
+            pending_withdrawal=func.coalesce(DoctorWallet.pending_withdrawal, 0) + request.amount,
+            lock_version=DoctorWallet.lock_version + 1,
+        )
+        .returning(DoctorWallet.id, DoctorWallet.current_balance)
+    )).fetchone()
+
+    if row is None:
+        await db.rollback()
         raise HTTPException(
             status_code=400,
-            detail=f"Insufficient balance. Available: ₹{wallet.current_balance}"
+            detail="Insufficient balance"
         )
-    
-    # Create withdrawal transaction
-    transaction = WalletTransaction(
-        wallet_id=wallet.id,
-        amount=request.amount,
-        transaction_type="withdrawal",
-        description=f"Withdrawal to {request.bank_account}",
-        balance_before=wallet.current_balance,
-        balance_after=wallet.current_balance - request.amount,
-        metadata={
-            "bank_account": request.bank_account,
-            "ifsc_code": request.ifsc_code,
-            "status": "pending"
-        }
-    )
-    db.add(transaction)
-    
-    # Update wallet
-    wallet.current_balance -= request.amount
-    wallet.total_withdrawn += request.amount
-    wallet.pending_withdrawal = (wallet.pending_withdrawal or 0) + request.amount
 
-    # --- Withdrawal notification doctor ko ---
-    send_notification(
-        db=db,
+    new_balance = row.current_balance
+
+    # Create withdrawal transaction — RETURNING se id wahi round-trip
+    # mein mil jata hai, alag flush nahi lagta
+    tx_id = (await db.execute(
+        insert(WalletTransaction)
+        .values(
+            wallet_id=row.id,
+            amount=request.amount,
+            transaction_type="withdrawal",
+            description=f"Withdrawal to {request.bank_account}",
+            balance_before=new_balance + request.amount,
+            balance_after=new_balance,
+            meta={
+                "bank_account": request.bank_account,
+                "ifsc_code": request.ifsc_code,
+                "status": "pending"
+            },
+            created_at=datetime.now(),
+        )
+        .returning(WalletTransaction.id)
+    )).scalar_one()
+    await db.commit()
+
+    # --- Withdrawal notification out-of-band — response pe wait nahi ---
+    background_tasks.add_task(
+        send_notification_background,
         user_id=current_user.id,
         title="💸 Withdrawal Request Submitted",
         message=(
@@ -1042,17 +1143,15 @@ async def withdraw_earnings(
         ),
         notification_type="wallet",
         related_entity_type="withdrawal",
-        related_entity_id=str(transaction.id)
+        related_entity_id=str(tx_id)
     )
-    
-    db.commit()
-    
+
     return {
         "status": "success",
-        "withdrawal_id": transaction.id,
+        "withdrawal_id": tx_id,
         "amount": request.amount,
         "estimated_credit": "2-3 business days",
-        "new_balance": wallet.current_balance
+        "new_balance": new_balance
     }
 
 
@@ -1063,75 +1162,132 @@ async def get_analytics_overview(
     current_user: User = Depends(get_current_user),
     month: Optional[int] = None,
     year: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     📊 DOCTOR ANALYTICS DASHBOARD
     """
-    
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
+
     # Default to current month
     if not month:
         month = datetime.now().month
     if not year:
         year = datetime.now().year
-    
-    # Total appointments this month
-    total_appointments = db.query(Appointment).filter(
-        and_(
-            Appointment.doctor_id == doctor.id,
-            extract('month', Appointment.date) == month,
-            extract('year', Appointment.date) == year
-        )
-    ).count()
-    
-    # Completed appointments
-    completed = db.query(Appointment).filter(
-        and_(
-            Appointment.doctor_id == doctor.id,
-            extract('month', Appointment.date) == month,
-            extract('year', Appointment.date) == year,
-            Appointment.status == 'completed'
+
+    doctor = (await db.execute(
+        select(Doctor.id, Doctor.rating, Doctor.total_consultations)
+        .where(Doctor.user_id == current_user.id)
+    )).one_or_none()
+
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor profile not found")
+
+    # Pehle summary table dekho — event listeners ise har appointment
+    # insert/status-change pe updated rakhte hain, toh ek row lookup kaafi hai
+    summary = (await db.execute(
+        select(DoctorMonthlyStats).where(
+            and_(
+                DoctorMonthlyStats.doctor_id == doctor.id,
+                DoctorMonthlyStats.year == year,
+                DoctorMonthlyStats.month == month
+            )
         )
-    ).count()
-    
-    # Cancelled appointments
-    cancelled = db.query(Appointment).filter(
-        and_(
-            Appointment.doctor_id == doctor.id,
-            extract('month', Appointment.date) == month,
-            extract('year', Appointment.date) == year,
-            Appointment.status == 'cancelled'
+    )).scalar_one_or_none()
+
+    if summary:
+        total = summary.total_appointments
+        completed = summary.completed
+        cancelled = summary.cancelled
+        month_earnings = summary.earnings
+    else:
+        # Backfill: is month ka summary row abhi nahi bana — live aggregate
+        # se compute karke store kar do, agla load O(1) ho jayega
+        month_start = date(year, month, 1)
+        next_month_start = date(year + (month // 12), (month % 12) + 1, 1)
+
+        # Dono aggregates independent hain — gather se parallel chalao.
+        # Har task apna session leta hai (AsyncSession tasks ke beech
+        # share karna safe nahi)
+        async def _appointment_counts():
+            async with AsyncSessionLocal() as session:
+                return (await session.execute(
+                    select(
+                        func.count(Appointment.id).label('total'),
+                        func.count(Appointment.id).filter(Appointment.status == 'completed').label('completed'),
+                        func.count(Appointment.id).filter(Appointment.status == 'cancelled').label('cancelled'),
+                    ).where(
+                        and_(
+                            Appointment.doctor_id == doctor.id,
+                            Appointment.date >= month_start,
+                            Appointment.date < next_month_start
+                        )
+                    )
+                )).one()
+
+        async def _month_earnings():
+            async with AsyncSessionLocal() as session:
+                return await session.scalar(
+                    select(func.coalesce(func.sum(WalletTransaction.amount), 0))
+                    .join(DoctorWallet, WalletTransaction.wallet_id == DoctorWallet.id)
+                    .where(
+                        and_(
+                            DoctorWallet.doctor_id == doctor.id,
+                            WalletTransaction.transaction_type == 'credit',
+                            WalletTransaction.created_at >= month_start,
+                            WalletTransaction.created_at < next_month_start
+                        )
+                    )
+                )
+
+        row, month_earnings = await asyncio.gather(
+            _appointment_counts(), _month_earnings()
         )
-    ).count()
-    
-    # Earnings this month
-    wallet = db.query(DoctorWallet).filter(
-        DoctorWallet.doctor_id == doctor.id
-    ).first()
-    
-    month_earnings = db.query(func.sum(WalletTransaction.amount)).filter(
-        and_(
-            WalletTransaction.wallet_id == wallet.id,
-            WalletTransaction.transaction_type == 'credit',
-            extract('month', WalletTransaction.created_at) == month,
-            extract('year', WalletTransaction.created_at) == year
+
+        total, completed, cancelled = row.total, row.completed, row.cancelled
+
+        # Upsert, plain INSERT nahi - do concurrent first requests (ya
+        # listener ke saath race) unique constraint pe 500 de dete the.
+        # Backfill values abhi-abhi compute hui committed truth hain,
+        # isliye conflict pe overwrite sahi hai.
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        table = DoctorMonthlyStats.__table__
+        await db.execute(
+            pg_insert(table).values(
+                doctor_id=doctor.id,
+                year=year,
+                month=month,
+                total_appointments=total,
+                completed=completed,
+                cancelled=cancelled,
+                earnings=int(month_earnings)
+            ).on_conflict_do_update(
+                constraint='uq_doctor_monthly_stats',
+                set_={
+                    'total_appointments': total,
+                    'completed': completed,
+                    'cancelled': cancelled,
+                    'earnings': int(month_earnings),
+                    'updated_at': datetime.now()
+                }
+            )
         )
-    ).scalar() or 0
-    
+        await db.commit()
+
+    wallet_balance = await db.scalar(
+        select(DoctorWallet.current_balance).where(DoctorWallet.doctor_id == doctor.id)
+    )
+
     return {
         "period": f"{month}/{year}",
-        "total_appointments": total_appointments,
+        "total_appointments": total,
         "completed": completed,
         "cancelled": cancelled,
-        "no_show": total_appointments - completed - cancelled,
+        "no_show": total - completed - cancelled,
         "earnings_this_month": int(month_earnings),
         "average_rating": float(doctor.rating),
         "total_consultations_lifetime": doctor.total_consultations,
-        "wallet_balance": wallet.current_balance if wallet else 0
+        "wallet_balance": wallet_balance or 0
     }
 
 
@@ -1140,49 +1296,54 @@ async def get_analytics_overview(
 @router.put("/profile/update", response_model=dict)
 async def update_doctor_profile(
     request: UpdateDoctorProfileRequest,
+    doctor: Doctor = Depends(get_current_doctor),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     ✏️ UPDATE DOCTOR PROFILE
     """
-    
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
 
     # Track kya changes hue — audit log ke liye
     changes = {}
 
-    if request.consultation_fee is not None:
-        changes["consultation_fee"] = {"old": doctor.consultation_fee, "new": request.consultation_fee}
+    # Same value dobara submit hua toh assignment hi mat karo —
+    # warna UIs full form bhejte hi bewajah UPDATE + audit insert hota hai
+    if request.consultation_fee is not None and request.consultation_fee != doctor.consultation_fee:
+        changes["consultation_fee"] = _audit_diff(doctor.consultation_fee, request.consultation_fee)
         doctor.consultation_fee = request.consultation_fee
-    
-    if request.specialties is not None:
-        changes["specialties"] = {"old": doctor.specialties, "new": request.specialties}
+
+    if request.specialties is not None and request.specialties != doctor.specialties:
+        changes["specialties"] = _audit_diff(doctor.specialties, request.specialties)
         doctor.specialties = request.specialties
-    
-    if request.bio is not None:
-        changes["bio"] = {"old": doctor.bio, "new": request.bio}
+
+    if request.bio is not None and request.bio != doctor.bio:
+        changes["bio"] = _audit_diff(doctor.bio, request.bio)
         doctor.bio = request.bio
-    
-    if request.is_available is not None:
-        changes["is_available"] = {"old": doctor.is_available, "new": request.is_available}
+
+    if request.is_available is not None and request.is_available != doctor.is_available:
+        changes["is_available"] = _audit_diff(doctor.is_available, request.is_available)
         doctor.is_available = request.is_available
 
+    # Kuch badla hi nahi — UPDATE aur audit dono skip
+    if not changes:
+        return {
+            "status": "success",
+            "message": "No changes"
+        }
+
     # --- Audit log: kya kya change hua ---
-    if changes:
-        audit = AuditLog(
-            user_id=current_user.id,
-            action="DOCTOR_PROFILE_UPDATED",
-            entity_type="doctor",
-            entity_id=str(doctor.id),
-            details=changes
-        )
-        db.add(audit)
-    
-    db.commit()
-    
+    audit = AuditLog(
+        user_id=current_user.id,
+        action="DOCTOR_PROFILE_UPDATED",
+        entity_type="doctor",
+        entity_id=str(doctor.id),
+        details=changes
+    )
+    db.add(audit)
+
+    await db.commit()
+
     return {
         "status": "success",
         "message": "Profile updated successfully"
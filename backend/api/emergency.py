@@ -6,22 +6,53 @@ backend_dir = Path(__file__).parent.parent
 if str(backend_dir) not in sys.path:
     sys.path.insert(0, str(backend_dir))
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, func
-from database.connection import get_db
-from database.models import User, Clinic, EmergencyRequest, Notification, AuditLog
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Header, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, select, text
+from database.connection import get_async_db
+from database.models import User, Clinic, EmergencyRequest, Notification, AuditLog, morton_zorder
+from services.cache import cache_get_json, cache_set_json
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
-import secrets
+import asyncio
+import hashlib
+import json
 import math
 import httpx
+import orjson
 import os
+from numba import njit
 GOOGLE_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 
 router = APIRouter(prefix="/api/emergency", tags=["Emergency"])
 
+# ✅ FIX: SHARED HTTP CLIENT WITH KEEP-ALIVE POOL
+# WHY: A fresh AsyncClient per geocode call paid DNS + TCP + TLS handshake
+# to Google on every emergency - the slowest step on the /request path.
+# One pooled client amortizes the handshake across requests.
+_http: Optional[httpx.AsyncClient] = None
+
+
+@router.on_event("startup")
+async def _open_http_client():
+    global _http
+    _http = httpx.AsyncClient(
+        http2=True,
+        timeout=5.0,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+    )
+
+
+@router.on_event("shutdown")
+async def _close_http_client():
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
 # ==================== PYDANTIC MODELS ====================
 
 class EmergencyRequestModel(BaseModel):
@@ -49,25 +80,46 @@ class EmergencyStatusUpdate(BaseModel):
 
 # ==================== HELPER FUNCTIONS ====================
 
-def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Calculate distance using Haversine formula"""
-    R = 6371  # Earth's radius in km
-    
+@njit('f8(f8,f8,f8,f8)', cache=True, fastmath=True)
+def _haversine_kernel(lat1, lng1, lat2, lng2):
+    """JIT-compiled Haversine core - straight-line machine code, no Python calls"""
+    R = 6371.0  # Earth's radius in km
+
     dlat = math.radians(lat2 - lat1)
     dlng = math.radians(lng2 - lng1)
-    
-    a = (math.sin(dlat / 2) ** 2 + 
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * 
+
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
          math.sin(dlng / 2) ** 2)
-    
+
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
-    
+    return R * c
+
+
+# Warm the JIT cache at import so the first emergency doesn't pay compile time
+_haversine_kernel(0.0, 0.0, 0.0, 0.0)
+
+
+def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Calculate distance using Haversine formula
+
+    ✅ FIX: COMPILED WITH NUMBA
+    WHY: Called in hot loops; LLVM fuses the trig into one kernel.
+    float() coercion matters - DECIMAL columns arrive as Decimal.
+    """
+    distance = _haversine_kernel(float(lat1), float(lng1), float(lat2), float(lng2))
     return round(distance, 2)
 
-def generate_emergency_id() -> str:
-    """Generate unique emergency ID like EMG123456"""
-    return f"EMG{secrets.randbelow(900000) + 100000}"
+async def generate_emergency_id(db: AsyncSession) -> str:
+    """Generate unique emergency ID like EMG123456
+
+    ✅ FIX: DB SEQUENCE INSTEAD OF secrets.randbelow
+    WHY: Random ids had a 1-in-900k collision surface and no uniqueness
+    check - a collision would blow up the later INSERT. nextval() is
+    guaranteed unique and skips the CSPRNG syscall on the hot path.
+    """
+    next_id = await db.scalar(text("SELECT nextval('emergency_id_seq')"))
+    return f"EMG{next_id}"
 
 def estimate_eta(distance_km: float, traffic_factor: float = 1.2) -> int:
     """
@@ -94,8 +146,8 @@ def estimate_eta(distance_km: float, traffic_factor: float = 1.2) -> int:
     
     return time_minutes + base_time
 
-def get_nearest_clinics_with_emergency(
-    db: Session,
+async def get_nearest_clinics_with_emergency(
+    db: AsyncSession,
     user_lat: float,
     user_lng: float,
     limit: int = 5,
@@ -103,82 +155,111 @@ def get_nearest_clinics_with_emergency(
 ) -> List[dict]:
     """
     Find nearest clinics/hospitals with emergency services
-    
+
     ✅ FIX 4: OPTIMIZED WITH BOUNDING BOX + REDUCED CALCULATIONS
     WHY: Prevents calculating distance for ALL clinics in database
-    
+
+    ✅ FIX 11: DISTANCE COMPUTED IN SQL, TOP-K IN SQL
+    WHY: Only the winning rows should ever leave the database
+
     BEFORE:
-    - Fetch ALL clinics (could be 1000+)
-    - Calculate distance for each in Python loop
-    - Sort and filter
-    - Result: 1000+ distance calculations
-    
+    - Fetch all in-box clinics, compute distance in Python (NumPy)
+    - Discarded rows still paid serialization + network cost
+
     AFTER:
-    - First filter by rough bounding box (SQL level)
-    - Only fetch clinics within box
-    - Calculate distance only for filtered results
-    - Result: ~10-50 distance calculations only
+    - Great-circle distance as a SQL expression (spherical law of cosines)
+    - ORDER BY distance LIMIT k - DB returns exactly k rows
+    - Bounding box predicates kept so the planner can use an index
     """
-    
+
+    # ✅ FIX: USER-SIDE TRIG HOISTED ONCE PER REQUEST
+    # WHY: user_lat/user_lng are invariant; compute their radians/cos/sin
+    # exactly once and feed the SQL expression plain constants
+    ulat_rad = math.radians(user_lat)
+    ulng_rad = math.radians(user_lng)
+    cos_ulat = math.cos(ulat_rad)
+    sin_ulat = math.sin(ulat_rad)
+
     # ✅ OPTIMIZATION: Create bounding box (rough filter at SQL level)
     # WHY: Dramatically reduces number of clinics to process
     # 1 degree latitude ≈ 111 km
     # So max_distance_km / 111 gives us the degree range
     lat_range = max_distance_km / 111.0
-    lng_range = max_distance_km / (111.0 * math.cos(math.radians(user_lat)))
-    
+    lng_range = max_distance_km / (111.0 * cos_ulat)
+
     # Bounding box coordinates
     min_lat = user_lat - lat_range
     max_lat = user_lat + lat_range
     min_lng = user_lng - lng_range
     max_lng = user_lng + lng_range
-    
-    # ✅ STEP 1: Fetch only clinics within bounding box (SQL-level filter)
-    # BEFORE: Fetched ALL clinics
-    # AFTER: Only fetch clinics within ~40km box
-    clinics = db.query(Clinic).filter(
-        and_(
-            Clinic.emergency_available == True,
-            Clinic.location_lat >= min_lat,
-            Clinic.location_lat <= max_lat,
-            Clinic.location_lng >= min_lng,
-            Clinic.location_lng <= max_lng
-        )
-    ).all()
-    
-    if not clinics:
-        return []
-    
-    # ✅ STEP 2: Calculate exact distance only for filtered clinics
-    # WHY: Much smaller dataset now (10-50 instead of 1000+)
-    clinics_with_distance = []
-    for clinic in clinics:
-        distance = calculate_distance(
-            user_lat, user_lng,
-            float(clinic.location_lat),
-            float(clinic.location_lng)
+
+    # ✅ FIX 12: Z-ORDER (MORTON) RANGE PROBE
+    # WHY: 2D bbox collapses to one 1D B-tree range on the zorder column,
+    # so the candidate scan is index-driven even as the clinics table grows.
+    # Corners of the bbox bound every Morton code inside it.
+    zmin = morton_zorder(min_lat, min_lng)
+    zmax = morton_zorder(max_lat, max_lng)
+
+    # ✅ STEP 1: Exact great-circle distance as a SQL expression
+    # WHY: Postgres evaluates this at C speed and keeps discarded rows server-side
+    distance_expr = (6371 * func.acos(
+        func.least(1.0,
+            cos_ulat *
+            func.cos(func.radians(Clinic.location_lat)) *
+            func.cos(func.radians(Clinic.location_lng) - ulng_rad) +
+            sin_ulat *
+            func.sin(func.radians(Clinic.location_lat))
         )
-        
-        # Only keep clinics within exact radius
-        if distance <= max_distance_km:
-            clinics_with_distance.append({
-                "clinic": clinic,
-                "distance_km": distance
-            })
-    
-    # Sort by distance
-    clinics_with_distance.sort(key=lambda x: x["distance_km"])
-    
-    return clinics_with_distance[:limit]
+    )).label("distance_km")
+
+    # ✅ STEP 2: Bounding box kept as rough prefilter (index-friendly),
+    # exact radius + ORDER BY + LIMIT all in the same query
+    result = await db.execute(
+        select(
+            Clinic.id,
+            Clinic.name,
+            Clinic.address,
+            Clinic.phone,
+            Clinic.location_lat,
+            Clinic.location_lng,
+            Clinic.ambulance_available,
+            Clinic.emergency_available,
+            Clinic.rating,
+            distance_expr
+        ).where(
+            and_(
+                Clinic.zorder.between(zmin, zmax),
+                Clinic.emergency_available == True,
+                Clinic.location_lat >= min_lat,
+                Clinic.location_lat <= max_lat,
+                Clinic.location_lng >= min_lng,
+                Clinic.location_lng <= max_lng,
+                distance_expr <= max_distance_km
+            )
+        ).order_by(distance_expr).limit(limit)
+    )
+    rows = result.all()
+
+    return [
+        {
+            "clinic": row,
+            "distance_km": round(float(row.distance_km), 2)
+        }
+        for row in rows
+    ]
 
 
-def send_emergency_notification(
-    db: Session,
+async def send_emergency_notification(
+    db: AsyncSession,
     user_id: int,
     emergency_id: str,
-    message: str
+    message: str,
+    commit: bool = True
 ):
-    """Send high-priority emergency notification"""
+    """Send high-priority emergency notification
+
+    commit=False se caller apni transaction me batch kar sakta hai
+    """
     notification = Notification(
         user_id=user_id,
         type="emergency_alert",
@@ -186,14 +267,16 @@ def send_emergency_notification(
         message=message
     )
     db.add(notification)
-    db.commit()
+    if commit:
+        await db.commit()
 
-def log_emergency_action(
-    db: Session,
+async def log_emergency_action(
+    db: AsyncSession,
     user_id: int,
     action: str,
     emergency_id: str,
-    details: dict
+    details: dict,
+    commit: bool = True
 ):
     """Log emergency action for audit"""
     audit = AuditLog(
@@ -204,7 +287,8 @@ def log_emergency_action(
         details=details
     )
     db.add(audit)
-    db.commit()
+    if commit:
+        await db.commit()
 
 async def reverse_geocode(lat: float, lng: float) -> str:
     """
@@ -215,10 +299,24 @@ async def reverse_geocode(lat: float, lng: float) -> str:
     
     BEFORE: return f"Location: {lat:.4f}, {lng:.4f}"
     AFTER: Calls Google Maps API to get real address
+
+    ✅ FIX: CACHED ON QUANTIZED COORDS
+    WHY: round(lat, 4) ≈ 11m - two emergencies from the same block
+    resolve to the same address without a second 50-300ms Google RTT.
+    Addresses don't move, so a day-long TTL is safe.
     """
-    
+
+    # Quantize first - cache key aur API call dono isi par
+    lat = round(lat, 4)
+    lng = round(lng, 4)
+
+    cache_key = f"geo:{lat}:{lng}"
+    cached = await cache_get_json(cache_key)
+    if cached is not None:
+        return cached["address"]
+
     # Option 1: Google Maps API (Requires API key)
-    
+
     try:
         url = f"https://maps.googleapis.com/maps/api/geocode/json"
         params = {
@@ -226,17 +324,19 @@ async def reverse_geocode(lat: float, lng: float) -> str:
             "key": GOOGLE_API_KEY
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=5.0)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                if data.get("results"):
-                    # Get formatted address
-                    address = data["results"][0]["formatted_address"]
-                    return address
-        
+        # ✅ FIX: REUSE POOLED CLIENT (no per-call TLS handshake)
+        # BEFORE: async with httpx.AsyncClient() as client: ...
+        response = await _http.get(url, params=params)
+
+        if response.status_code == 200:
+            data = response.json()
+
+            if data.get("results"):
+                # Get formatted address
+                address = data["results"][0]["formatted_address"]
+                await cache_set_json(cache_key, {"address": address}, ttl=86400)
+                return address
+
         # Fallback if API fails
         return f"Location: {lat:.4f}, {lng:.4f}"
         
@@ -305,7 +405,7 @@ async def alert_nearest_clinic(
 async def create_emergency_request(
     request: EmergencyRequestModel,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     🚨 EMERGENCY REQUEST
@@ -326,24 +426,31 @@ async def create_emergency_request(
     """
     
     # Verify user exists
-    user = db.query(User).filter(User.id == request.user_id).first()
+    user = await db.scalar(select(User).where(User.id == request.user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    # ✅ FIX 6: ASYNC REVERSE GEOCODING
-    # WHY: Non-blocking external API call
-    address = request.address
-    if not address:
-        address = await reverse_geocode(request.latitude, request.longitude)
-    
-    # ✅ FIX 7: OPTIMIZED CLINIC SEARCH (uses bounding box now)
-    # WHY: Dramatically faster - filters at SQL level first
-    nearest_clinics = get_nearest_clinics_with_emergency(
-        db=db,
-        user_lat=request.latitude,
-        user_lng=request.longitude,
-        limit=5
-    )
+
+    # ✅ FIX 6+7: GEOCODING AND CLINIC SEARCH RUN CONCURRENTLY
+    # WHY: The two are independent - Google RTT (~100ms+) and the DB query
+    # (~20ms) now overlap, so the wait is max() of the two, not the sum.
+    if request.address:
+        address = request.address
+        nearest_clinics = await get_nearest_clinics_with_emergency(
+            db=db,
+            user_lat=request.latitude,
+            user_lng=request.longitude,
+            limit=5
+        )
+    else:
+        address, nearest_clinics = await asyncio.gather(
+            reverse_geocode(request.latitude, request.longitude),
+            get_nearest_clinics_with_emergency(
+                db=db,
+                user_lat=request.latitude,
+                user_lng=request.longitude,
+                limit=5
+            )
+        )
     
     if not nearest_clinics:
         raise HTTPException(
@@ -357,7 +464,7 @@ async def create_emergency_request(
     distance_km = nearest["distance_km"]
     
     # Generate emergency ID
-    emergency_id = generate_emergency_id()
+    emergency_id = await generate_emergency_id(db)
     
     # ✅ FIX 8: DYNAMIC ETA CALCULATION
     # WHY: Considers traffic based on time of day
@@ -378,20 +485,23 @@ async def create_emergency_request(
             status="requested"
         )
         
+        # ✅ FIX: ONE TRANSACTION, ONE FSYNC
+        # BEFORE: emergency commit + notification commit + audit commit = 3 WAL fsyncs
+        # AFTER: flush everything, single commit - atomic bhi ho gaya
         db.add(emergency)
-        db.commit()
-        db.refresh(emergency)
-        
+        await db.flush()
+
         # Send notification to user
-        send_emergency_notification(
+        await send_emergency_notification(
             db=db,
             user_id=request.user_id,
             emergency_id=emergency_id,
-            message=f"Emergency services dispatched! Ambulance ETA: {eta_minutes} mins. Stay calm, help is on the way."
+            message=f"Emergency services dispatched! Ambulance ETA: {eta_minutes} mins. Stay calm, help is on the way.",
+            commit=False
         )
-        
+
         # Log action
-        log_emergency_action(
+        await log_emergency_action(
             db=db,
             user_id=request.user_id,
             action="EMERGENCY_REQUESTED",
@@ -402,8 +512,12 @@ async def create_emergency_request(
                 "condition": request.patient_condition,
                 "nearest_clinic": nearest_clinic.name,
                 "distance_km": distance_km
-            }
+            },
+            commit=False
         )
+
+        await db.commit()
+        await db.refresh(emergency)
         
         # Background tasks (don't block response)
         background_tasks.add_task(notify_emergency_contacts, user, emergency_id, address)
@@ -449,7 +563,7 @@ async def create_emergency_request(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Emergency request failed: {str(e)}")
 
 
@@ -457,7 +571,7 @@ async def create_emergency_request(
 @router.get("/{emergency_id}", response_model=dict)
 async def get_emergency_status(
     emergency_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get real-time status of emergency request
@@ -468,26 +582,37 @@ async def get_emergency_status(
     User can refresh this to track ambulance
     """
     
+    # ✅ FIX: REMAINING ETA COMPUTED IN SQL
+    # WHY: elapsed-minutes arithmetic rides along as one integer column
+    # instead of Python datetime subtraction per request
+    remaining_expr = func.greatest(
+        0,
+        EmergencyRequest.ambulance_eta -
+        func.floor(func.extract('epoch', func.now() - EmergencyRequest.created_at) / 60)
+    ).label("remaining_eta")
+
     # ✅ FIX: USE JOINEDLOAD FOR RELATED DATA
     # BEFORE: Separate queries for user and clinic
-    # AFTER: Single query with JOIN
-    emergency = db.query(EmergencyRequest).options(
-        joinedload(EmergencyRequest.user),
-        joinedload(EmergencyRequest.assigned_clinic)
-    ).filter(
-        EmergencyRequest.id == emergency_id
-    ).first()
-    
-    if not emergency:
+    # AFTER: Single query with JOIN (eager load is mandatory on AsyncSession -
+    # lazy attribute access would raise outside the event loop context)
+    row = (await db.execute(
+        select(EmergencyRequest, remaining_expr).options(
+            joinedload(EmergencyRequest.user),
+            joinedload(EmergencyRequest.assigned_clinic)
+        ).where(EmergencyRequest.id == emergency_id)
+    )).first()
+
+    if not row:
         raise HTTPException(status_code=404, detail="Emergency request not found")
-    
+
+    emergency = row.EmergencyRequest
+
     # No separate clinic query needed - already loaded
     clinic = emergency.assigned_clinic
-    
-    # Calculate current ETA (decreases over time)
+
+    # Current ETA (decreases over time) - already computed server-side
     if emergency.status == "dispatched" and emergency.ambulance_eta:
-        time_elapsed = (datetime.now() - emergency.created_at).seconds // 60
-        current_eta = max(0, emergency.ambulance_eta - time_elapsed)
+        current_eta = int(row.remaining_eta)
     else:
         current_eta = None
     
@@ -526,51 +651,51 @@ async def get_emergency_status(
     }
 
 
-@router.get("/user/{user_id}/history", response_model=dict)
+@router.get("/user/{user_id}/history")
 async def get_user_emergency_history(
     user_id: int,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get user's emergency request history
-    
+
     ✅ FIX 10: ADDED JOINEDLOAD TO PREVENT N+1
     WHY: Prevents separate query for each emergency's clinic
-    
-    BEFORE: 1 emergency query + 10 clinic queries = 11 queries
-    AFTER: 1 query with JOIN
+
+    ✅ FIX: STREAMING NDJSON RESPONSE
+    WHY: One line per emergency leaves as soon as its row arrives -
+    constant memory and first byte out after the first row, instead of
+    buffering the whole history for power users.
     """
-    
-    # ✅ FIX: JOINEDLOAD CLINIC DATA
-    emergencies = db.query(EmergencyRequest).options(
+
+    stmt = select(EmergencyRequest).options(
         joinedload(EmergencyRequest.assigned_clinic)
-    ).filter(
+    ).where(
         EmergencyRequest.user_id == user_id
-    ).order_by(EmergencyRequest.created_at.desc()).limit(limit).all()
-    
-    history = []
-    for emergency in emergencies:
-        # No separate clinic query needed - already loaded
-        clinic = emergency.assigned_clinic
-        
-        history.append({
-            "emergency_id": emergency.id,
-            "date": emergency.created_at.strftime("%Y-%m-%d"),
-            "time": emergency.created_at.strftime("%I:%M %p"),
-            "type": emergency.emergency_type,
-            "status": emergency.status,
-            "hospital": clinic.name if clinic else "Unknown",
-            "location": emergency.address,
-            "eta_minutes": emergency.ambulance_eta,
-            "completed": emergency.status == "completed"
-        })
-    
-    return {
-        "user_id": user_id,
-        "total": len(history),
-        "emergencies": history
-    }
+    ).order_by(
+        EmergencyRequest.created_at.desc()
+    ).limit(limit).execution_options(yield_per=100)
+
+    async def generate():
+        result = await db.stream(stmt)
+        async for emergency in result.scalars():
+            # No separate clinic query needed - already loaded
+            clinic = emergency.assigned_clinic
+
+            yield orjson.dumps({
+                "emergency_id": emergency.id,
+                "date": emergency.created_at.strftime("%Y-%m-%d"),
+                "time": emergency.created_at.strftime("%I:%M %p"),
+                "type": emergency.emergency_type,
+                "status": emergency.status,
+                "hospital": clinic.name if clinic else "Unknown",
+                "location": emergency.address,
+                "eta_minutes": emergency.ambulance_eta,
+                "completed": emergency.status == "completed"
+            }) + b"\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 
 @router.post("/cancel", response_model=dict)
@@ -578,17 +703,17 @@ async def cancel_emergency_request(
     emergency_id: str,
     user_id: int,
     reason: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Cancel emergency request
-    
+
     Only allowed if ambulance hasn't arrived yet
     """
-    
-    emergency = db.query(EmergencyRequest).filter(
-        EmergencyRequest.id == emergency_id
-    ).first()
+
+    emergency = await db.scalar(
+        select(EmergencyRequest).where(EmergencyRequest.id == emergency_id)
+    )
     
     if not emergency:
         raise HTTPException(status_code=404, detail="Emergency request not found")
@@ -610,25 +735,28 @@ async def cancel_emergency_request(
     try:
         emergency.status = "cancelled"
         emergency.completed_at = datetime.now()
-        
-        db.commit()
-        
+
         # Send notification
-        send_emergency_notification(
+        await send_emergency_notification(
             db=db,
             user_id=user_id,
             emergency_id=emergency_id,
-            message="Emergency request cancelled. Hope you're safe!"
+            message="Emergency request cancelled. Hope you're safe!",
+            commit=False
         )
-        
+
         # Log action
-        log_emergency_action(
+        await log_emergency_action(
             db=db,
             user_id=user_id,
             action="EMERGENCY_CANCELLED",
             emergency_id=emergency_id,
-            details={"reason": reason}
+            details={"reason": reason},
+            commit=False
         )
+
+        # Single commit - status change + notification + audit ek saath
+        await db.commit()
         
         return {
             "status": "success",
@@ -637,7 +765,7 @@ async def cancel_emergency_request(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Cancellation failed: {str(e)}")
 
 
@@ -645,90 +773,111 @@ async def cancel_emergency_request(
 async def get_nearby_emergency_hospitals(
     latitude: float,
     longitude: float,
+    response: Response,
     radius_km: float = 10.0,
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get all nearby hospitals with emergency services
-    
+
     Useful for showing on map before emergency
+
+    ✅ FIX: REDIS CACHE + ETag/304
+    WHY: Map UIs poll this while the user pans; coords quantized to
+    3 decimals (~110m) so nearby pans share one cached payload, and a
+    matching If-None-Match skips the body entirely.
     """
-    
-    clinics = get_nearest_clinics_with_emergency(
-        db=db,
-        user_lat=latitude,
-        user_lng=longitude,
-        limit=10,
-        max_distance_km=radius_km
-    )
-    
-    hospitals = []
-    for item in clinics:
-        clinic = item["clinic"]
-        hospitals.append({
-            "id": clinic.id,
-            "name": clinic.name,
-            "address": clinic.address,
-            "phone": clinic.phone,
-            "location": {
-                "latitude": float(clinic.location_lat),
-                "longitude": float(clinic.location_lng)
+
+    cache_key = f"nearby:{round(latitude, 3)}:{round(longitude, 3)}:{radius_km}"
+    payload = await cache_get_json(cache_key)
+
+    if payload is None:
+        clinics = await get_nearest_clinics_with_emergency(
+            db=db,
+            user_lat=latitude,
+            user_lng=longitude,
+            limit=10,
+            max_distance_km=radius_km
+        )
+
+        hospitals = []
+        for item in clinics:
+            clinic = item["clinic"]
+            hospitals.append({
+                "id": clinic.id,
+                "name": clinic.name,
+                "address": clinic.address,
+                "phone": clinic.phone,
+                "location": {
+                    "latitude": clinic.location_lat,
+                    "longitude": clinic.location_lng
+                },
+                "distance_km": item["distance_km"],
+                "has_ambulance": clinic.ambulance_available,
+                "has_emergency": clinic.emergency_available,
+                "rating": float(clinic.rating)
+            })
+
+        payload = {
+            "user_location": {
+                "latitude": latitude,
+                "longitude": longitude
             },
-            "distance_km": item["distance_km"],
-            "has_ambulance": clinic.ambulance_available,
-            "has_emergency": clinic.emergency_available,
-            "rating": float(clinic.rating)
-        })
-    
-    return {
-        "user_location": {
-            "latitude": latitude,
-            "longitude": longitude
-        },
-        "radius_km": radius_km,
-        "total": len(hospitals),
-        "hospitals": hospitals
-    }
+            "radius_km": radius_km,
+            "total": len(hospitals),
+            "hospitals": hospitals
+        }
+        await cache_set_json(cache_key, payload, ttl=300)
+
+    etag = f'"{hashlib.md5(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()}"'
+    if if_none_match == etag:
+        return Response(status_code=304)
+
+    response.headers["ETag"] = etag
+    return payload
 
 
 @router.get("/stats/system", response_model=dict)
 async def get_emergency_system_stats(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get emergency system statistics
-    
+
     For admin dashboard
+
+    ✅ FIX: ONE CONDITIONAL-AGGREGATE QUERY
+    WHY: Was 3 count round-trips + fetching EVERY completed row just to
+    average response times in Python. One pass, zero rows transferred.
     """
-    
-    total_requests = db.query(EmergencyRequest).count()
-    
-    active_emergencies = db.query(EmergencyRequest).filter(
-        EmergencyRequest.status.in_(["requested", "dispatched", "arrived"])
-    ).count()
-    
-    completed = db.query(EmergencyRequest).filter(
-        EmergencyRequest.status == "completed"
-    ).count()
-    
-    # Average response time (for completed emergencies)
-    completed_emergencies = db.query(EmergencyRequest).filter(
-        EmergencyRequest.status == "completed"
-    ).all()
-    
-    if completed_emergencies:
-        response_times = [
-            (e.completed_at - e.created_at).seconds // 60
-            for e in completed_emergencies
-            if e.completed_at
-        ]
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-    else:
-        avg_response_time = 0
-    
+
+    row = (await db.execute(
+        select(
+            func.count().label("total"),
+            func.count().filter(
+                EmergencyRequest.status.in_(["requested", "dispatched", "arrived"])
+            ).label("active"),
+            func.count().filter(
+                EmergencyRequest.status == "completed"
+            ).label("completed"),
+            # AVG response time (minutes) computed in SQL, completed rows only
+            func.avg(
+                func.extract('epoch', EmergencyRequest.completed_at - EmergencyRequest.created_at) / 60
+            ).filter(
+                EmergencyRequest.status == "completed",
+                EmergencyRequest.completed_at.isnot(None)
+            ).label("avg_minutes")
+        ).select_from(EmergencyRequest)
+    )).one()
+
+    total_requests = row.total
+    completed = row.completed
+    avg_response_time = float(row.avg_minutes) if row.avg_minutes is not None else 0
+
     return {
         "total_emergencies": total_requests,
-        "active_now": active_emergencies,
+        "active_now": row.active,
         "completed": completed,
         "avg_response_time_minutes": round(avg_response_time, 1),
         "success_rate": round((completed / total_requests * 100), 1) if total_requests > 0 else 0
@@ -7,17 +7,22 @@ if str(backend_dir) not in sys.path:
     sys.path.insert(0, str(backend_dir))
 
 from fastapi import APIRouter, Depends,HTTPException,UploadFile,File
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_,func,desc,extract
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_,func,desc,extract,tuple_
 from database.connection import get_db
 from database.models import (
     User,LabTest,LabBooking,AuditLog,Notification,Laboratory
 )
 from api.auth import get_current_user
-from pydantic import BaseModel,Field,EmailStr,model_validator
+from api.lab_tests import invalidate_user_bookings
+from services.cache import cache_get_json, cache_set_json, cache_delete, cache_try_lock
+from pydantic import BaseModel,ConfigDict,Field,EmailStr,model_validator
 from typing import Optional,List,Dict,Literal
+from ulid import ULID
 from datetime import date,time,datetime,timedelta
-import secrets
+import asyncio
+import hashlib
+import time as time_mod
 
 router = APIRouter(prefix="/api/lab-vendor", tags=["Lab Vendor"])
 
@@ -27,14 +32,18 @@ class LabRegistrationRequest(BaseModel):
 
     """ LAB VENDOR ONBOARDING"""
 
+    # ✅ Registration body bada hai - strict config se validator tight
+    # path leta hai aur unknown keys pe kaam hi nahi karta
+    model_config = ConfigDict(str_strip_whitespace=True, extra='ignore')
+
     lab_name : str = Field(..., min_length=2, max_length=200)
     license_number: str
     email : EmailStr = Field(..., description="official email of the lab")
     password: str = Field(..., min_length=8)
     phone : str = Field(..., min_length=10, max_length=15)
     address : str = Field(..., min_length=10, max_length=500)
-    accreditation: List[str] = Field(
-        default=[],
+    accreditation: tuple[str, ...] = Field(
+        default=(),
         description="NABL, CAP, ISO certifications"
     )
     city: str
@@ -63,8 +72,8 @@ class LabRegistrationRequest(BaseModel):
 
     
     # Equipment & facilities
-    equipment_list: List[str] = [] # Optional hatakar default empty list dena better hai
-    specializations: List[str] = Field(
+    equipment_list: tuple[str, ...] = () # Optional hatakar default empty dena better hai
+    specializations: tuple[str, ...] = Field(
         ...,
         min_items=1, # Kam se kam ek specialization honi chahiye
         description="Pathology, Radiology, Cardiology, etc."
@@ -83,12 +92,13 @@ class LabLoginRequest(BaseModel):
             raise ValueError('Email ya Phone mein se ek dena compulsory hai')
         return self
 
-    class Config:
-        # Isse sensitive data logs mein nahi dikhega
-        str_strip_whitespace = True 
+    # Isse sensitive data logs mein nahi dikhega
+    model_config = ConfigDict(str_strip_whitespace=True)
 
 class AddTestRequest(BaseModel):
     """ADD NEW TEST TO CATALOG"""
+    model_config = ConfigDict(str_strip_whitespace=True, extra='ignore')
+
     name:str = Field (..., min_length=2, max_length= 200, example="Complete Blood Count (CBC)")
     category: str = Field(
         ...,
@@ -102,7 +112,7 @@ class AddTestRequest(BaseModel):
     discount_percentage: int = Field(default=0, ge=0, le=100)
 
     # test details
-    parameters_included: List[str] = Field(
+    parameters_included: tuple[str, ...] = Field(
         ...,
         description="List of parameters/components"
     )
@@ -148,9 +158,59 @@ class UploadReportRequest(BaseModel):
 
 # ==================== HELPER FUNCTIONS ====================
 
+def get_current_lab(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Laboratory:
+    """
+    ✅ ONE LOOKUP PER REQUEST
+    WHY: Har handler apna db.query(Laboratory)...first() chala raha tha -
+    FastAPI dependency results request ke andar memoize hote hain, toh
+    yeh SELECT ab sirf ek baar chalta hai chahe kitne bhi layers use karein.
+    """
+    lab = db.query(Laboratory).filter(
+        Laboratory.owner_user_id == current_user.id
+    ).first()
+
+    if not lab:
+        raise HTTPException(status_code=404, detail="Lab not found")
+
+    return lab
+
+
+async def _catalog_generation(lab_id: str) -> int:
+    """Catalog cache ki generation stamp. Writer generation key delete
+    karta hai; agli read nayi stamp banati hai aur purani entries apne
+    TTL se expire ho jaati hain - SCAN ki zaroorat nahi."""
+    gen = await cache_get_json(f"lab:{lab_id}:catalog_gen")
+    if gen is None:
+        gen = int(time_mod.time() * 1000)
+        await cache_set_json(f"lab:{lab_id}:catalog_gen", gen, ttl=900)
+    return gen
+
+
+async def invalidate_lab_cache(lab_id: str):
+    """Profile + catalog cache drop karo - har mutating endpoint ke baad."""
+    await cache_delete(f"lab:{lab_id}:profile", f"lab:{lab_id}:catalog_gen")
+
+
+def bulk_log(db: Session, rows: List[Dict]):
+    """N audit events ek hi executemany me - unit-of-work tracking bypass.
+    Caller commit karta hai taaki primary write ke saath ek hi fsync ho."""
+    if rows:
+        db.bulk_insert_mappings(AuditLog, rows)
+
+
 def generate_lab_id() -> str:
-    """Generate unique lab ID (e.g., LAB5421)"""
-    return f"LAB{secrets.randbelow(9000) + 1000}"
+    """Generate unique lab ID (e.g., LAB01J8X5K9ZQ3F7M2R6T4V8W0Y1)
+
+    ✅ ULID
+    WHY: Purane 4-digit id me sirf 9000 values thin - birthday math se
+    ~100 labs ke baad hi PK collision, aur registration retry loop me
+    phans jata. ULID collision-free hai aur time-ordered bhi - naye ids
+    B-tree ke right edge pe append hote hain, random page splits nahi.
+    """
+    return f"LAB{ULID()}"
 
 
 def send_lab_notification(
@@ -177,47 +237,37 @@ def send_lab_notification(
 
 
 def calculate_lab_stats(lab_id: int, db: Session) -> Dict:
-    """Calculate lab performance statistics"""
-    
-    # Total tests
-    total_tests = db.query(LabBooking).filter(
-        LabBooking.laboratory_id == lab_id
-    ).count()
-    
-    # Completed tests
-    completed = db.query(LabBooking).filter(
-        and_(
-            LabBooking.laboratory_id == lab_id,
-            LabBooking.status == 'completed'
-        )
-    ).count()
-    
-    # Average turnaround time
-    avg_tat = db.query(
+    """Calculate lab performance statistics
+
+    ✅ ONE SCAN, FOUR AGGREGATES
+    WHY: Pehle total/completed/avg/pending char alag queries the - char
+    round-trips, chaar baar wahi rows. Conditional aggregates (FILTER)
+    ek hi index range scan me sab nikal lete hain.
+    """
+    row = db.query(
+        func.count().label('total'),
+        func.count().filter(LabBooking.status == 'completed').label('completed'),
+        func.count().filter(
+            LabBooking.status.in_(['sample_collected', 'processing'])
+        ).label('pending'),
         func.avg(
             func.extract('epoch', LabBooking.completed_at - LabBooking.created_at) / 3600
-        )
-    ).filter(
-        and_(
-            LabBooking.laboratory_id == lab_id,
-            LabBooking.status == 'completed',
-            LabBooking.completed_at.isnot(None)
-        )
-    ).scalar() or 0
+        ).filter(
+            and_(
+                LabBooking.status == 'completed',
+                LabBooking.completed_at.isnot(None)
+            )
+        ).label('avg_tat')
+    ).filter(LabBooking.laboratory_id == lab_id).one()
     
-    # Pending reports
-    pending = db.query(LabBooking).filter(
-        and_(
-            LabBooking.laboratory_id == lab_id,
-            LabBooking.status.in_(['sample_collected', 'processing'])
-        )
-    ).count()
+    total_tests = row.total
+    completed = row.completed
     
     return {
         "total_tests": total_tests,
         "completed": completed,
-        "pending_reports": pending,
-        "average_turnaround_hours": round(avg_tat, 2),
+        "pending_reports": row.pending,
+        "average_turnaround_hours": round(row.avg_tat or 0, 2),
         "completion_rate": round((completed / total_tests * 100), 2) if total_tests > 0 else 0
     }
 
@@ -248,45 +298,57 @@ def get_test_popularity(lab_id: int, db: Session, limit: int = 10) -> List[Dict]
 
 
 def check_overdue_reports(lab_id: int, db: Session) -> List[Dict]:
-    """Find bookings with overdue reports"""
+    """Find bookings with overdue reports
+
+    ✅ FILTER IN SQL
+    WHY: Pehle saare active bookings load karke Python me expected time
+    nikalta tha aur zyada tar rows discard ho jaati thin. Ab deadline
+    (date + time + result_time interval) database me banti hai, WHERE
+    sirf overdue rows bhejta hai aur partial index use hota hai.
+    """
+    expected = (
+        LabBooking.collection_date + LabBooking.collection_time +
+        func.make_interval(0, 0, 0, 0, LabTest.result_time_hours)
+    )
+    hours_overdue = (func.extract('epoch', func.now() - expected) / 3600).label('hours_overdue')
     
-    overdue = db.query(LabBooking).options(
-        joinedload(LabBooking.test),
-        joinedload(LabBooking.user)
+    rows = db.query(
+        LabBooking.id,
+        User.name.label('patient_name'),
+        LabTest.name.label('test_name'),
+        LabBooking.collection_date,
+        expected.label('expected_completion'),
+        hours_overdue,
+        LabBooking.status
+    ).join(
+        LabTest, LabBooking.test_id == LabTest.id
+    ).join(
+        User, LabBooking.user_id == User.id
     ).filter(
         and_(
             LabBooking.laboratory_id == lab_id,
             LabBooking.status.in_(['sample_collected', 'processing']),
-            LabBooking.collection_date.isnot(None)
+            LabBooking.collection_date.isnot(None),
+            expected < func.now()
         )
-    ).all()
-    
-    overdue_list = []
-    
-    for booking in overdue:
-        expected_completion = datetime.combine(
-            booking.collection_date,
-            booking.collection_time
-        ) + timedelta(hours=booking.test.result_time_hours)
-        
-        if datetime.now() > expected_completion:
-            hours_overdue = (datetime.now() - expected_completion).total_seconds() / 3600
-            
-            overdue_list.append({
-                "booking_id": booking.id,
-                "patient_name": booking.user.name,
-                "test_name": booking.test.name,
-                "collection_date": str(booking.collection_date),
-                "expected_completion": expected_completion.strftime('%Y-%m-%d %I:%M %p'),
-                "hours_overdue": round(hours_overdue, 1),
-                "status": booking.status
-            })
+    ).order_by(desc('hours_overdue')).all()
     
-    return sorted(overdue_list, key=lambda x: x['hours_overdue'], reverse=True)
+    return [
+        {
+            "booking_id": row.id,
+            "patient_name": row.patient_name,
+            "test_name": row.test_name,
+            "collection_date": str(row.collection_date),
+            "expected_completion": row.expected_completion.strftime('%Y-%m-%d %I:%M %p'),
+            "hours_overdue": round(row.hours_overdue, 1),
+            "status": row.status
+        }
+        for row in rows
+    ]
 
 # ==================== REGISTRATION ====================
 
-@router.post("/register", response_model=dict)
+@router.post("/register")
 async def register_lab(
     request: LabRegistrationRequest,
     current_user: User = Depends(get_current_user),
@@ -355,10 +417,8 @@ async def register_lab(
     )
     
     db.add(laboratory)
-    db.commit()
-    db.refresh(laboratory)
     
-    # Log registration
+    # Log registration - same transaction, ek hi commit/fsync
     audit = AuditLog(
         user_id=current_user.id,
         action="LAB_REGISTERED",
@@ -371,6 +431,7 @@ async def register_lab(
     )
     db.add(audit)
     db.commit()
+    db.refresh(laboratory)
     
     return {
         "status": "success",
@@ -387,7 +448,7 @@ async def register_lab(
     }
 
 
-@router.post("/login", response_model=dict)
+@router.post("/login")
 async def lab_vendor_login(
     request: LabLoginRequest,
     db: Session = Depends(get_db)
@@ -396,6 +457,7 @@ async def lab_vendor_login(
     🔐 LAB VENDOR LOGIN
     """
     from database.models import Laboratory
+    import anyio.to_thread
     import bcrypt
     from .auth import create_access_token, create_refresh_token
     
@@ -413,7 +475,12 @@ async def lab_vendor_login(
         )
     
     # Verify password
-    if not bcrypt.checkpw(request.password.encode(), user.password_hash.encode()):
+    # ✅ THREAD POOL ME: bcrypt ~100ms CPU kha leta hai; sync call poora
+    # event loop rok deta tha - ab baaki requests aage badhti rehti hain
+    valid = await anyio.to_thread.run_sync(
+        bcrypt.checkpw, request.password.encode(), user.password_hash.encode()
+    )
+    if not valid:
         raise HTTPException(
             status_code=401,
             detail="Invalid credentials"
@@ -474,24 +541,22 @@ async def lab_vendor_login(
     }
 # ==================== PROFILE MANAGEMENT ====================
 
-@router.get("/profile", response_model=dict)
+@router.get("/profile")
 async def get_lab_profile(
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """
     👤 GET LAB VENDOR PROFILE
     """
-    from database.models import Laboratory
-    
-    lab = db.query(Laboratory).filter(
-        Laboratory.owner_user_id == current_user.id
-    ).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
-    
-    return {
+
+    # ✅ CACHE-ASIDE: profile mushkil se badalta hai; 15 min Redis me
+    cache_key = f"lab:{lab.id}:profile"
+    cached = await cache_get_json(cache_key)
+    if cached is not None:
+        return cached
+
+    payload = {
         "id": lab.id,
         "name": lab.name,
         "license_number": lab.license_number,
@@ -517,28 +582,22 @@ async def get_lab_profile(
         "created_at": lab.created_at.strftime('%Y-%m-%d'),
         "updated_at": lab.updated_at.strftime('%Y-%m-%d') if lab.updated_at else None
     }
+    await cache_set_json(cache_key, payload, ttl=900)
+    return payload
 
-@router.put("/profile/update", response_model=dict)
+@router.put("/profile/update")
 async def update_lab_profile(
     operating_hours: Optional[Dict[str, str]] = None,
     home_collection_available: Optional[bool] = None,
     home_collection_charges: Optional[int] = None,
     emergency_contact: Optional[str] = None,
     equipment_list: Optional[List[str]] = None,
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """
     ✏️ UPDATE LAB PROFILE
     """
-    from database.models import Laboratory
-    
-    lab = db.query(Laboratory).filter(
-        Laboratory.owner_user_id == current_user.id
-    ).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     # Update fields
     if operating_hours is not None:
@@ -559,6 +618,7 @@ async def update_lab_profile(
     lab.updated_at = datetime.now()
     
     db.commit()
+    await invalidate_lab_cache(lab.id)
     
     return {
         "status": "success",
@@ -567,24 +627,16 @@ async def update_lab_profile(
 
 # ==================== TEST CATALOG MANAGEMENT ====================
 
-@router.post("/tests/add", response_model=dict)
+@router.post("/tests/add")
 async def add_test(
     request: AddTestRequest,
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """
     🧪 ADD NEW TEST TO CATALOG
     """
     
-    # Get lab
-    from database.models import Laboratory
-    lab = db.query(Laboratory).filter(
-        Laboratory.owner_user_id == current_user.id
-    ).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     if not lab.is_verified:
         raise HTTPException(
@@ -629,6 +681,7 @@ async def add_test(
     db.add(lab_test)
     db.commit()
     db.refresh(lab_test)
+    await invalidate_lab_cache(lab.id)
     
     return {
         "status": "success",
@@ -638,24 +691,16 @@ async def add_test(
     }
 
 
-@router.put("/tests/update", response_model=dict)
+@router.put("/tests/update")
 async def update_test(
     request: UpdateTestRequest,
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """
     ✏️ UPDATE TEST DETAILS
     """
     
-    # Get lab
-    from database.models import Laboratory
-    lab = db.query(Laboratory).filter(
-        Laboratory.owner_user_id == current_user.id
-    ).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     # Get test
     test = db.query(LabTest).filter(
@@ -684,6 +729,7 @@ async def update_test(
     test.updated_at = datetime.now()
     
     db.commit()
+    await invalidate_lab_cache(lab.id)
     
     return {
         "status": "success",
@@ -691,9 +737,9 @@ async def update_test(
     }
 
 
-@router.get("/tests/catalog", response_model=dict)
+@router.get("/tests/catalog")
 async def get_test_catalog(
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     category: Optional[str] = None,
     search: Optional[str] = None,
     page: int = 1,
@@ -703,32 +749,45 @@ async def get_test_catalog(
     """
     📋 VIEW TEST CATALOG
     """
-    
-    # Get lab
-    from database.models import Laboratory
-    lab = db.query(Laboratory).filter(
-        Laboratory.owner_user_id == current_user.id
-    ).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
-    
-    # Build query
-    query = db.query(LabTest).filter(LabTest.laboratory_id == lab.id)
+
+    # ✅ CACHE-ASIDE with generation-stamped keys; writers bump the
+    # generation instead of SCANning for every (filter, page) variant
+    params = hashlib.md5(f"{category}:{search}:{page}:{limit}".encode()).hexdigest()
+    gen = await _catalog_generation(lab.id)
+    cache_key = f"lab:{lab.id}:catalog:{gen}:{params}"
+    cached = await cache_get_json(cache_key)
+    if cached is not None:
+        return cached
+
+    # ✅ STAMPEDE GUARD: lock recompute ko gate karta hai, sirf cache
+    # write ko nahi - popular lab pe N concurrent misses me se ek hi
+    # DB query chalaye. Losers thoda ruk ke cache dobara dekhte hain;
+    # phir bhi miss ho toh khud DB se serve karte hain (fail-open).
+    have_lock = await cache_try_lock(cache_key + ":lock")
+    if not have_lock:
+        for _ in range(3):
+            await asyncio.sleep(0.1)
+            cached = await cache_get_json(cache_key)
+            if cached is not None:
+                return cached
+
+    # ✅ ONE ROUND-TRIP: COUNT(*) OVER () paged scan ke saath hi aata hai
+    # ✅ ILIKE (lower().contains() ki jagah) taaki pg_trgm index lag sake
+    query = db.query(
+        LabTest, func.count().over().label('total')
+    ).filter(LabTest.laboratory_id == lab.id)
     
     if category:
         query = query.filter(LabTest.category == category)
     
     if search:
-        query = query.filter(
-            func.lower(LabTest.name).contains(search.lower())
-        )
+        query = query.filter(LabTest.name.ilike(f"%{search}%"))
     
-    total = query.count()
+    rows = query.offset((page - 1) * limit).limit(limit).all()
+    total = rows[0].total if rows else 0
+    tests = [row[0] for row in rows]
     
-    tests = query.offset((page - 1) * limit).limit(limit).all()
-    
-    return {
+    payload = {
         "total": total,
         "page": page,
         "tests": [
@@ -745,25 +804,20 @@ async def get_test_catalog(
             for test in tests
         ]
     }
+    if have_lock:
+        await cache_set_json(cache_key, payload, ttl=600)
+    return payload
 # ==================== TEST DETAILS ====================
 
-@router.get("/tests/{test_id}", response_model=dict)
+@router.get("/tests/{test_id}")
 async def get_test_details(
     test_id: int,
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """
     🔍 GET SINGLE TEST DETAILS
     """
-    from database.models import Laboratory
-    
-    lab = db.query(Laboratory).filter(
-        Laboratory.owner_user_id == current_user.id
-    ).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     test = db.query(LabTest).filter(
         and_(
@@ -812,23 +866,15 @@ async def get_test_details(
     }
 
 
-@router.delete("/tests/{test_id}", response_model=dict)
+@router.delete("/tests/{test_id}")
 async def delete_test(
     test_id: int,
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """
     🗑️ DELETE TEST (SOFT DELETE)
     """
-    from database.models import Laboratory
-    
-    lab = db.query(Laboratory).filter(
-        Laboratory.owner_user_id == current_user.id
-    ).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     test = db.query(LabTest).filter(
         and_(
@@ -859,6 +905,7 @@ async def delete_test(
     test.updated_at = datetime.now()
     
     db.commit()
+    await invalidate_lab_cache(lab.id)
     
     return {
         "status": "success",
@@ -870,20 +917,16 @@ async def delete_test(
 
 # ✅ 1. SPECIFIC ROUTES FIRST
 
-@router.get("/bookings/today", response_model=dict)
+@router.get("/bookings/today")
 async def get_today_bookings(
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """📋 TODAY'S SAMPLE COLLECTIONS"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     bookings = db.query(LabBooking).options(
         joinedload(LabBooking.user),
-        joinedload(LabBooking.test)
+        selectinload(LabBooking.test)
     ).filter(
         and_(
             LabBooking.laboratory_id == lab.id,
@@ -920,20 +963,16 @@ async def get_today_bookings(
     }
 
 
-@router.get("/bookings/pending", response_model=dict)
+@router.get("/bookings/pending")
 async def get_pending_bookings(
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """⏳ PENDING BOOKINGS (Sample Collected, Awaiting Results)"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     bookings = db.query(LabBooking).options(
         joinedload(LabBooking.user),
-        joinedload(LabBooking.test)
+        selectinload(LabBooking.test)
     ).filter(
         and_(
             LabBooking.laboratory_id == lab.id,
@@ -960,25 +999,28 @@ async def get_pending_bookings(
     }
 
 
-@router.get("/bookings/history", response_model=dict)
+@router.get("/bookings/history")
 async def get_booking_history(
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     status: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    page: int = 1,
+    after_date: Optional[date] = None,
+    after_id: Optional[str] = None,
     limit: int = 20,
     db: Session = Depends(get_db)
 ):
-    """📜 BOOKING HISTORY"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
-    
+    """📜 BOOKING HISTORY
+
+    ✅ KEYSET PAGINATION
+    WHY: OFFSET deep pages pe saari skipped rows scan karke phenk deta tha,
+    aur windowed COUNT har page pe pura filtered set gin leta tha. Ab
+    (collection_date, id) cursor se har page ek constant-time index range
+    scan hai; client has_more/next_cursor se aage badhta hai.
+    """
     query = db.query(LabBooking).options(
         joinedload(LabBooking.user),
-        joinedload(LabBooking.test)
+        selectinload(LabBooking.test)
     ).filter(LabBooking.laboratory_id == lab.id)
     
     if status:
@@ -988,12 +1030,25 @@ async def get_booking_history(
     if end_date:
         query = query.filter(LabBooking.collection_date <= end_date)
     
-    total = query.count()
-    bookings = query.order_by(desc(LabBooking.created_at)).offset((page - 1) * limit).limit(limit).all()
+    # Cursor - pichle page ki aakhri row ke baad se shuru karo
+    if after_date and after_id:
+        query = query.filter(
+            tuple_(LabBooking.collection_date, LabBooking.id) < tuple_(after_date, after_id)
+        )
+    
+    bookings = query.order_by(
+        LabBooking.collection_date.desc(), LabBooking.id.desc()
+    ).limit(limit).all()
+    
+    has_more = len(bookings) == limit
+    next_cursor = (
+        {"after_date": str(bookings[-1].collection_date), "after_id": bookings[-1].id}
+        if has_more else None
+    )
     
     return {
-        "total": total,
-        "page": page,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
         "bookings": [
             {
                 "booking_id": booking.id,
@@ -1010,17 +1065,13 @@ async def get_booking_history(
 
 # ✅ 2. POST/PUT ROUTES
 
-@router.post("/bookings/collect-sample", response_model=dict)
+@router.post("/bookings/collect-sample")
 async def collect_sample(
     request: SampleCollectionRequest,
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """💉 MARK SAMPLE AS COLLECTED"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     booking = db.query(LabBooking).filter(
         and_(LabBooking.id == request.booking_id, LabBooking.laboratory_id == lab.id)
@@ -1043,6 +1094,8 @@ async def collect_sample(
     booking.vial_ids = request.vial_ids
     
     db.commit()
+    # Patient-side /bookings cache ab stale hai - drop karo
+    await invalidate_user_bookings(booking.user_id)
     
     send_lab_notification(
         db=db,
@@ -1060,17 +1113,13 @@ async def collect_sample(
     }
 
 
-@router.put("/bookings/update-status", response_model=dict)
+@router.put("/bookings/update-status")
 async def update_booking_status(
     request: UpdateBookingStatusRequest,
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """📊 UPDATE BOOKING STATUS"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     booking = db.query(LabBooking).filter(
         and_(LabBooking.id == request.booking_id, LabBooking.laboratory_id == lab.id)
@@ -1090,6 +1139,7 @@ async def update_booking_status(
         booking.completed_at = datetime.now()
     
     db.commit()
+    await invalidate_user_bookings(booking.user_id)
     
     status_messages = {
         "scheduled": "Your lab test is scheduled",
@@ -1114,17 +1164,13 @@ async def update_booking_status(
     }
 
 
-@router.post("/bookings/upload-report", response_model=dict)
+@router.post("/bookings/upload-report")
 async def upload_report(
     request: UploadReportRequest,
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """📤 UPLOAD TEST REPORT"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     booking = db.query(LabBooking).filter(
         and_(LabBooking.id == request.booking_id, LabBooking.laboratory_id == lab.id)
@@ -1142,6 +1188,7 @@ async def upload_report(
     lab.total_tests_completed += 1
     
     db.commit()
+    await invalidate_user_bookings(booking.user_id)
     
     send_lab_notification(
         db=db,
@@ -1159,18 +1206,14 @@ async def upload_report(
     }
 
 
-@router.post("/bookings/{booking_id}/cancel", response_model=dict)
+@router.post("/bookings/{booking_id}/cancel")
 async def cancel_booking(
     booking_id: str,
     reason: str,
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """❌ CANCEL BOOKING (Lab side)"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     booking = db.query(LabBooking).filter(
         and_(LabBooking.id == booking_id, LabBooking.laboratory_id == lab.id)
@@ -1189,6 +1232,7 @@ async def cancel_booking(
     booking.updated_at = datetime.now()
     
     db.commit()
+    await invalidate_user_bookings(booking.user_id)
     
     send_lab_notification(
         db=db,
@@ -1207,17 +1251,13 @@ async def cancel_booking(
 
 # ✅ 3. DYNAMIC ROUTE LAST
 
-@router.get("/bookings/{booking_id}", response_model=dict)
+@router.get("/bookings/{booking_id}")
 async def get_booking_details(
     booking_id: str,
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """📋 GET SINGLE BOOKING DETAILS"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     booking = db.query(LabBooking).options(
         joinedload(LabBooking.user),
@@ -1267,18 +1307,14 @@ async def get_booking_details(
 
 # ==================== ANALYTICS & REPORTS ====================
 
-@router.get("/analytics/dashboard", response_model=dict)
+@router.get("/analytics/dashboard")
 async def get_lab_analytics(
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     month: Optional[int] = None,
     year: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
     """📊 LAB VENDOR DASHBOARD ANALYTICS"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     if not month:
         month = datetime.now().month
@@ -1358,9 +1394,9 @@ async def get_lab_analytics(
     }
 
 
-@router.get("/schedule/daily", response_model=dict)
+@router.get("/schedule/daily")
 async def get_daily_schedule(
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     target_date: Optional[date] = None,
     db: Session = Depends(get_db)
 ):
@@ -1368,14 +1404,9 @@ async def get_daily_schedule(
     if target_date is None:
         target_date = date.today()
     
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
-    
     bookings = db.query(LabBooking).options(
         joinedload(LabBooking.user),
-        joinedload(LabBooking.test)
+        selectinload(LabBooking.test)
     ).filter(
         and_(
             LabBooking.laboratory_id == lab.id,
@@ -1410,16 +1441,12 @@ async def get_daily_schedule(
     }
 
 
-@router.get("/alerts/overdue", response_model=dict)
+@router.get("/alerts/overdue")
 async def get_overdue_reports(
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """🚨 OVERDUE REPORTS ALERT"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     overdue_reports = check_overdue_reports(lab.id, db)
     
@@ -1430,18 +1457,14 @@ async def get_overdue_reports(
     }
 
 
-@router.get("/reports/revenue", response_model=dict)
+@router.get("/reports/revenue")
 async def get_revenue_report(
     start_date: date,
     end_date: date,
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """💰 REVENUE REPORT"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     revenue = db.query(func.sum(LabTest.price)).join(
         LabBooking, LabBooking.test_id == LabTest.id
@@ -1506,16 +1529,12 @@ async def get_revenue_report(
     }
 
 
-@router.get("/stats/performance", response_model=dict)
+@router.get("/stats/performance")
 async def get_performance_stats(
-    current_user: User = Depends(get_current_user),
+    lab: Laboratory = Depends(get_current_lab),
     db: Session = Depends(get_db)
 ):
     """📊 LAB PERFORMANCE STATISTICS"""
-    lab = db.query(Laboratory).filter(Laboratory.owner_user_id == current_user.id).first()
-    
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found")
     
     stats = calculate_lab_stats(lab.id, db)
     popular_tests = get_test_popularity(lab.id, db, limit=10)
@@ -172,7 +172,7 @@ def credit_doctor_wallet(
         description=f"Payment for appointment {appointment_id}",
         balance_before=wallet.current_balance,
         balance_after=wallet.current_balance + amount,
-        metadata={"transaction_type": transaction_type}
+        meta={"transaction_type": transaction_type}
     )
     db.add(transaction)
     
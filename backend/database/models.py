@@ -2,7 +2,7 @@
 Medicare Platform - Database Models
 Complete schema for all features with all missing columns added
 """
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Boolean, DECIMAL, Time, Date, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Boolean, DECIMAL, Time, Date, Float, BigInteger, UniqueConstraint, CheckConstraint, Computed, event, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -138,8 +138,8 @@ class Clinic(Base):
     id = Column(String(50), primary_key=True)
     name = Column(String(200), nullable=False)
     address = Column(Text, nullable=False)
-    location_lat = Column(DECIMAL(10, 8), nullable=False)
-    location_lng = Column(DECIMAL(11, 8), nullable=False)
+    location_lat = Column(Float, nullable=False)  # double precision - Decimal hot path me slow hai
+    location_lng = Column(Float, nullable=False)
     phone = Column(String(15))
     email = Column(String(100))
     working_hours = Column(JSONB)
@@ -148,6 +148,7 @@ class Clinic(Base):
     insurance_accepted = Column(JSONB)
     rating = Column(DECIMAL(3, 2), default=0.0)
     total_reviews = Column(Integer, default=0)
+    zorder = Column(BigInteger, index=True)  # Morton code of quantized lat/lng (event listener se maintained)
     created_at = Column(DateTime, default=datetime.now)
     
     # Relationships
@@ -332,8 +333,19 @@ class DoctorWallet(Base):
     total_earned = Column(Integer, default=0)
     total_withdrawn = Column(Integer, default=0)
     pending_withdrawal = Column(Integer, default=0)
+    lock_version = Column(Integer, nullable=False, default=0)  # Optimistic locking ke liye
+    # Generated column — threshold DB mein ek jagah, admin filters ke liye indexable
+    can_withdraw = Column(Boolean, Computed('current_balance >= 500', persisted=True))
     last_updated = Column(DateTime, default=datetime.now, onupdate=datetime.now)
-    
+
+    # Concurrent updates pe SQLAlchemy khud lock_version check karega (StaleDataError on mismatch)
+    __mapper_args__ = {"version_id_col": lock_version}
+
+    # DB-level invariant — guarded UPDATE ke saath defense in depth
+    __table_args__ = (
+        CheckConstraint('current_balance >= 0', name='ck_doctor_wallets_balance_non_negative'),
+    )
+
     # Relationships
     doctor = relationship("Doctor", back_populates="wallet", uselist=False)
     transactions = relationship("WalletTransaction", back_populates="wallet")
@@ -351,13 +363,36 @@ class WalletTransaction(Base):
     appointment_id = Column(String(20), ForeignKey("appointments.id"), unique=True)  # Changed to String for consistency
     balance_before = Column(Integer)
     balance_after = Column(Integer, nullable=False)
+    # "metadata" Declarative mein reserved naam hai, isliye attribute "meta"
+    # hai — DB column "metadata" hi hai (bank info, withdrawal status etc.)
+    meta = Column("metadata", JSONB)
     created_at = Column(DateTime, default=datetime.now)
-    
+
     # Relationships
     doctor = relationship("Doctor", back_populates="wallet_transactions")
     wallet = relationship("DoctorWallet", back_populates="transactions")
 
 
+class DoctorMonthlyStats(Base):
+    """Pre-aggregated monthly analytics — dashboard ko month-bhar ke
+    appointments scan karne ki zaroorat nahi, ek row lookup kaafi hai."""
+    __tablename__ = "doctor_monthly_stats"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    doctor_id = Column(Integer, ForeignKey('doctors.id'), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    total_appointments = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+    earnings = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (
+        UniqueConstraint('doctor_id', 'year', 'month', name='uq_doctor_monthly_stats'),
+    )
+
+
 # ============================================
 # QR CODE MANAGEMENT
 # ============================================
@@ -829,10 +864,22 @@ class LabTest(Base):
     bookings = relationship("LabBooking", back_populates="test")
 
 
+# Canonical booking-status vocabulary - lab_tests aur lab_vendor dono yahi
+# states likhte hain, aur cache invalidation isi tuple se per-status keys
+# banata hai. Naya status yahan add karo, kisi handler me inline nahi.
+LAB_BOOKING_STATUSES = ("scheduled", "sample_collected", "processing", "completed", "cancelled")
+
+
 class LabBooking(Base):
     __tablename__ = "lab_bookings"
     
-    id = Column(String(20), primary_key=True)  # LAB123 format
+    # DB-side id default - migration c91d4e72a5b0 wala hi expression, taaki
+    # create_all se bana schema bhi match kare aur SQLAlchemy ko pata ho ki
+    # PK server-generated hai (executemany RETURNING ids collect karta hai)
+    id = Column(
+        String(20), primary_key=True,
+        server_default=text("('LAB' || upper(substr(replace(gen_random_uuid()::text, '-', ''), 1, 8)))")
+    )
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     laboratory_id = Column(String(50), ForeignKey("laboratories.id"), nullable=False)
     test_id = Column(Integer, ForeignKey("lab_tests.id"), nullable=False)
@@ -853,7 +900,7 @@ class LabBooking(Base):
     address = Column(Text)
     
     is_home_collection = Column(Boolean, default=False)
-    status = Column(String(20), default='scheduled')  # scheduled | completed | cancelled
+    status = Column(String(20), default='scheduled')  # LAB_BOOKING_STATUSES me se ek
     payment_id = Column(Integer, ForeignKey("payments.id"))
     report_file = Column(String(255))
     
@@ -926,4 +973,96 @@ class AuditLog(Base):
     created_at = Column(DateTime, default=datetime.now)
     
     # Relationships
-    user = relationship("User", back_populates="audit_logs")
\ No newline at end of file
+    user = relationship("User", back_populates="audit_logs")
+
+# ============================================
+# EVENT LISTENERS
+# ============================================
+
+def _part1by1(v: int) -> int:
+    """31-bit int ke bits ko spread karo (standard five-step dilation)."""
+    v &= 0x7FFFFFFF
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    v = (v | (v << 1)) & 0x5555555555555555
+    return v
+
+
+def morton_zorder(lat, lng) -> int:
+    """Lat/lng ko 62-bit Morton (Z-order) code me interleave karo.
+
+    2D bbox query ek contiguous B-tree range probe ban jaati hai —
+    clinic lookup is se index-assisted hota hai.
+    """
+    qlat = int((float(lat) + 90.0) / 180.0 * (2 ** 31 - 1))
+    qlng = int((float(lng) + 180.0) / 360.0 * (2 ** 31 - 1))
+    return _part1by1(qlat) | (_part1by1(qlng) << 1)
+
+
+@event.listens_for(Clinic, "before_insert")
+@event.listens_for(Clinic, "before_update")
+def _clinic_zorder_sync(mapper, connection, target):
+    """Clinic save hote hi zorder ko lat/lng ke sync me rakho."""
+    if target.location_lat is not None and target.location_lng is not None:
+        target.zorder = morton_zorder(target.location_lat, target.location_lng)
+
+
+@event.listens_for(Appointment, "after_insert")
+def _monthly_stats_on_insert(mapper, connection, target):
+    """Naya appointment aate hi uske month ka summary row increment karo."""
+    _bump_monthly_stats(connection, target, total_delta=1)
+
+
+@event.listens_for(Appointment, "after_update")
+def _monthly_stats_on_update(mapper, connection, target):
+    """Status change (completed/cancelled) pe summary row update karo."""
+    from sqlalchemy import inspect as sa_inspect
+
+    history = sa_inspect(target).attrs.status.history
+    if not history.has_changes():
+        return
+
+    new_status = history.added[0] if history.added else None
+    old_status = history.deleted[0] if history.deleted else None
+
+    completed_delta = (1 if new_status == 'completed' else 0) - (1 if old_status == 'completed' else 0)
+    cancelled_delta = (1 if new_status == 'cancelled' else 0) - (1 if old_status == 'cancelled' else 0)
+    earnings_delta = target.consultation_fee * (1 if new_status == 'completed' else (-1 if old_status == 'completed' else 0))
+
+    if completed_delta or cancelled_delta:
+        _bump_monthly_stats(
+            connection, target,
+            completed_delta=completed_delta,
+            cancelled_delta=cancelled_delta,
+            earnings_delta=earnings_delta
+        )
+
+
+def _bump_monthly_stats(connection, appointment, total_delta=0,
+                        completed_delta=0, cancelled_delta=0, earnings_delta=0):
+    """Upsert on (doctor_id, year, month) — counters ko atomically badhao."""
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+    table = DoctorMonthlyStats.__table__
+    stmt = pg_insert(table).values(
+        doctor_id=appointment.doctor_id,
+        year=appointment.date.year,
+        month=appointment.date.month,
+        total_appointments=max(total_delta, 0),
+        completed=max(completed_delta, 0),
+        cancelled=max(cancelled_delta, 0),
+        earnings=max(earnings_delta, 0),
+        updated_at=datetime.now()
+    ).on_conflict_do_update(
+        constraint='uq_doctor_monthly_stats',
+        set_={
+            'total_appointments': table.c.total_appointments + total_delta,
+            'completed': table.c.completed + completed_delta,
+            'cancelled': table.c.cancelled + cancelled_delta,
+            'earnings': table.c.earnings + earnings_delta,
+            'updated_at': datetime.now()
+        }
+    )
+    connection.execute(stmt)
@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from pathlib import Path
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from api.appointments import router as appointments_router
 from api.auth import router as auth_router
@@ -23,7 +24,8 @@ Base.metadata.create_all(bind=engine)
 app = FastAPI(
     title="MediCare API",
     description="Complete Healthcare Platform API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # stdlib json se kaafi fast, datetime native
 )
 # ✅ IMPORTANT: Serve uploaded files
 UPLOAD_DIR = Path("uploads")
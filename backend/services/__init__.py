@@ -5,5 +5,6 @@ __all__ = [
     "notification_service",
     "sms_service",
     "distance_calculator",
+    "cache",
 ]
 
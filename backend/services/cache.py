@@ -0,0 +1,113 @@
+"""
+🗄 Redis Cache Service
+
+Cross-request caching ke liye thin Redis wrapper.
+Redis available nahi ho (ya down ho) toh har call safely
+None/False return karti hai — API DB se serve karta rahega.
+"""
+import json
+import os
+
+try:
+    import redis
+    import redis.asyncio as redis_async
+
+    _conn_kwargs = dict(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=0,
+        decode_responses=True,
+        socket_connect_timeout=1,
+        socket_timeout=1,
+    )
+    # ✅ ASYNC CLIENT
+    # WHY: handlers event loop pe chalte hain — sync client ka 1s socket
+    # timeout Redis slow/down hone pe POORA loop block kar deta tha,
+    # sirf caller nahi. Async client pe sirf awaiting request rukti hai.
+    _redis_client = redis_async.Redis(**_conn_kwargs)
+    # Sync client sirf SQLAlchemy event listeners ke liye — woh sync
+    # flush ke andar chalte hain jahan await possible nahi hai
+    _sync_client = redis.Redis(**_conn_kwargs)
+except ImportError:
+    _redis_client = None
+    _sync_client = None
+
+
+async def cache_get_json(key: str):
+    """Key ka JSON value lao — miss ya Redis error pe None."""
+    if _redis_client is None:
+        return None
+    try:
+        raw = await _redis_client.get(key)
+        return json.loads(raw) if raw else None
+    except Exception:
+        return None
+
+
+async def cache_set_json(key: str, value, ttl: int = 300) -> bool:
+    """JSON value store karo with TTL (seconds). Error pe False."""
+    if _redis_client is None:
+        return False
+    try:
+        await _redis_client.setex(key, ttl, json.dumps(value, default=str))
+        return True
+    except Exception:
+        return False
+
+
+async def cache_try_lock(key: str, ttl: int = 5) -> bool:
+    """SET NX lock - ek hi writer cache repopulate kare (stampede guard).
+    Redis unavailable ho toh True, taaki caller block na ho."""
+    if _redis_client is None:
+        return True
+    try:
+        return bool(await _redis_client.set(key, "1", nx=True, ex=ttl))
+    except Exception:
+        return True
+
+
+async def cache_delete(*keys: str) -> bool:
+    """Keys invalidate karo. Error pe False."""
+    if _redis_client is None or not keys:
+        return False
+    try:
+        await _redis_client.delete(*keys)
+        return True
+    except Exception:
+        return False
+
+
+# ============================================
+# EVENT-DRIVEN INVALIDATION
+# ============================================
+
+def _sync_delete(*keys: str):
+    """Event listeners ke liye sync delete — fail-open, short timeout."""
+    if _sync_client is None or not keys:
+        return
+    try:
+        _sync_client.delete(*keys)
+    except Exception:
+        pass
+
+
+def _register_invalidation_listeners():
+    """Doctor row change hote hi uski cache entry delete karo —
+    stale reads ka koi window nahi rehta."""
+    from sqlalchemy import event
+    from database.models import Doctor, LabTest
+
+    def _invalidate_doctor(mapper, connection, target):
+        _sync_delete(f"doctor:uid:{target.user_id}")
+
+    def _invalidate_lab_test_catalog(mapper, connection, target):
+        # Bookings endpoint ka test-catalog cache — kisi bhi test ke
+        # write pe poori key drop, agla read rebuild karega
+        _sync_delete("labtests:catalog")
+
+    for hook in ("after_insert", "after_update", "after_delete"):
+        event.listen(Doctor, hook, _invalidate_doctor)
+        event.listen(LabTest, hook, _invalidate_lab_test_catalog)
+
+
+_register_invalidation_listeners()